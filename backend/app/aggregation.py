@@ -0,0 +1,98 @@
+# app/aggregation.py
+"""
+SQL-side order aggregation shared by crud, migrations and stats.
+
+The snapshot price of a line is resolved in SQL with the same fallback chain
+everywhere: unit_price, then line_total, then the current product price, then
+the legacy total_amount column. Results come back as plain tuples.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import Table, case, func, select
+from sqlalchemy.sql import Select
+
+from . import models
+
+
+class OrderLine(NamedTuple):
+    code: str
+    product_name: str
+    quantity: int
+    price: Optional[float]
+    subtotal: float
+
+    def as_item(self) -> Dict:
+        return {
+            "product_name": self.product_name,
+            "quantity": self.quantity,
+            "price": self.price,
+            "subtotal": self.subtotal,
+        }
+
+
+def unit_price_expr(order: Table, product: Table):
+    """Unit price at purchase; None when only a line total was recorded."""
+    return func.coalesce(
+        order.c.unit_price,
+        case((order.c.line_total.is_(None), product.c.price)),
+    )
+
+
+def line_total_expr(order: Table, product: Table):
+    """Line subtotal following the snapshot fallback chain."""
+    return func.coalesce(
+        func.round(order.c.unit_price * order.c.quantity, 2),
+        order.c.line_total,
+        func.round(product.c.price * order.c.quantity, 2),
+        order.c.total_amount,
+        0.0,
+    )
+
+
+def order_lines_query(order: Table = None) -> Select:
+    """Line items with resolved prices, in insertion order."""
+    order = order if order is not None else models.Order.__table__
+    product = models.Product.__table__
+    return (
+        select(
+            order.c.code,
+            func.coalesce(product.c.name, "Unknown"),
+            order.c.quantity,
+            unit_price_expr(order, product),
+            line_total_expr(order, product),
+        )
+        .select_from(order.outerjoin(product, product.c.id == order.c.product_id))
+        .order_by(order.c.id)
+    )
+
+
+def order_totals_query(order: Table = None) -> Select:
+    """Per-code totals: code, user_id, total, item_count, collected, created_at."""
+    order = order if order is not None else models.Order.__table__
+    product = models.Product.__table__
+    return (
+        select(
+            order.c.code,
+            func.max(order.c.user_id).label("user_id"),
+            func.round(func.sum(line_total_expr(order, product)), 2).label("total"),
+            func.count(order.c.id).label("item_count"),
+            func.min(order.c.collected).label("collected"),
+            func.min(order.c.created_at).label("created_at"),
+        )
+        .select_from(order.outerjoin(product, product.c.id == order.c.product_id))
+        .group_by(order.c.code)
+    )
+
+
+def order_lines(db, codes: Iterable[str], order: Table = None) -> Dict[str, List[OrderLine]]:
+    """Load the resolved line items for `codes`, keyed by code."""
+    lines: Dict[str, List[OrderLine]] = {code: [] for code in codes}
+    if not lines:
+        return lines
+
+    order = order if order is not None else models.Order.__table__
+    query = order_lines_query(order).where(order.c.code.in_(list(lines)))
+    for row in db.execute(query):
+        line = OrderLine._make(row)
+        lines[line.code].append(line)
+    return lines
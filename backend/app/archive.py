@@ -0,0 +1,112 @@
+# app/archive.py
+"""
+Hot/cold archival of collected orders.
+
+Collected orders older than ARCHIVE_AFTER_DAYS have their lines moved from
+`orders` to `archived_orders` in small transactions; the order header stays in
+place with `archived` set, so lookups know where to read the lines from.
+
+Run incrementally from the command line:
+
+    python -m app.archive --older-than-days 365 --batch-size 500
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .cache import order_cache
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 365))
+
+_LINE_COLUMNS = [
+    "id",
+    "product_id",
+    "user_id",
+    "quantity",
+    "code",
+    "collected",
+    "total_amount",
+    "created_at",
+    "unit_price",
+    "line_total",
+]
+
+
+def archive_collected_orders(
+    db: Session,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = 500,
+    max_batches: Optional[int] = None,
+) -> int:
+    """Archive collected orders older than the cutoff; returns the number of orders moved."""
+    order = models.Order.__table__
+    archived = models.ArchivedOrder.__table__
+    header = models.OrderHeader.__table__
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        codes = list(
+            db.execute(
+                select(header.c.code)
+                .where(
+                    header.c.collected.is_(True),
+                    header.c.archived.is_(False),
+                    header.c.created_at < cutoff,
+                )
+                .order_by(header.c.id)
+                .limit(batch_size)
+            ).scalars()
+        )
+        if not codes:
+            break
+
+        lines = select(*(order.c[name] for name in _LINE_COLUMNS)).where(
+            order.c.code.in_(codes)
+        )
+        db.execute(insert(archived).from_select(_LINE_COLUMNS, lines))
+        db.execute(delete(order).where(order.c.code.in_(codes)))
+        db.execute(update(header).where(header.c.code.in_(codes)).values(archived=True))
+        crud.bump_versions(db, "orders", "stats")
+        db.commit()
+        order_cache.invalidate(*codes)
+
+        moved += len(codes)
+        batches += 1
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old collected orders.")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--max-batches", type=int, default=None, help="stop after N batches"
+    )
+    args = parser.parse_args()
+
+    from .database import SessionLocal, engine
+    from .migrations import run_migrations
+
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        moved = archive_collected_orders(
+            db,
+            older_than_days=args.older_than_days,
+            batch_size=args.batch_size,
+            max_batches=args.max_batches,
+        )
+    finally:
+        db.close()
+    print(f"Archived {moved} orders.")
+
+
+if __name__ == "__main__":
+    main()
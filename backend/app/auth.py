@@ -1,10 +1,14 @@
 # auth.py
 import os
+import threading
 import uuid
 from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
 from jose import jwt, JWTError, ExpiredSignatureError
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from . import crud, models
 from .database import get_db
@@ -17,8 +21,10 @@ REFRESH_TOKEN_SECRET_KEY = os.getenv("REFRESH_TOKEN_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+EVENTS_TOKEN_EXPIRE_SECONDS = int(os.getenv("EVENTS_TOKEN_EXPIRE_SECONDS", 60))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login", auto_error=False)
 
 
 # ========================
@@ -56,22 +62,132 @@ def create_refresh_token(data: dict, expires_delta: timedelta = None):
     return jwt.encode(to_encode, REFRESH_TOKEN_SECRET_KEY, algorithm=ALGORITHM)
 
 
+def create_events_token(data: dict):
+    """
+    Short-lived token for the SSE order feed. EventSource can't send an
+    Authorization header, so it travels in the query string instead; the own
+    audience keeps it from being usable as an access token.
+    """
+    now = _now_utc()
+    to_encode = data.copy()
+    to_encode.update(
+        {
+            "exp": now + timedelta(seconds=EVENTS_TOKEN_EXPIRE_SECONDS),
+            "iat": now,
+            "jti": str(uuid.uuid4()),
+            "aud": "mtca-events",
+        }
+    )
+    return jwt.encode(to_encode, ACCESS_TOKEN_SECRET_KEY, algorithm=ALGORITHM)
+
+
 # ========================
 # 🚫 TOKEN REVOCATION (BLACKLIST)
 # ========================
 
 
-def revoke_token(db: Session, jti: str, reason: str = "logout"):
-    """Add the token JTI to the RevokedToken table. idempotent."""
-    if not db.query(models.RevokedToken).filter_by(jti=jti).first():
-        revoked = models.RevokedToken(jti=jti, reason=reason)
-        db.add(revoked)
+REVOKED_TOKEN_SYNC_SECONDS = int(os.getenv("REVOKED_TOKEN_SYNC_SECONDS", 5))
+
+
+class RevokedTokenSet:
+    """
+    In-process copy of `revoked_tokens` (jti -> expiry) so authenticated
+    requests need no revocation query. Revocations made here are added
+    immediately; `sync` picks up rows written by other workers and drops
+    entries whose token has expired anyway.
+    """
+
+    def __init__(self):
+        self._expiry: Dict[str, Optional[datetime]] = {}
+        self._synced_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._expiry
+
+    def add(self, jti: str, expires_at: Optional[datetime]):
+        with self._lock:
+            self._expiry[jti] = expires_at
+
+    def sync(self, db: Session):
+        table = models.RevokedToken.__table__
+        started = datetime.utcnow()
+        query = select(table.c.jti, table.c.expires_at).where(
+            or_(table.c.expires_at.is_(None), table.c.expires_at > started)
+        )
+        if self._synced_at is not None:
+            # overlap generously; revoked_at comes from each worker's clock
+            query = query.where(table.c.revoked_at >= self._synced_at - timedelta(minutes=1))
+        rows = db.execute(query).all()
+        with self._lock:
+            self._expiry.update(rows)
+            for jti in [j for j, exp in self._expiry.items() if exp and exp <= started]:
+                del self._expiry[jti]
+            self._synced_at = started
+
+
+revoked_tokens = RevokedTokenSet()
+
+
+def revoke_token(
+    db: Session,
+    jti: str,
+    reason: str = "logout",
+    expires_at: Optional[datetime] = None,
+) -> bool:
+    """
+    Add the token JTI to the RevokedToken table. Idempotent; returns False if
+    it was already revoked (e.g. a refresh token replayed on another worker).
+    """
+    try:
+        db.add(models.RevokedToken(jti=jti, reason=reason, expires_at=expires_at))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        revoked_tokens.add(jti, expires_at)
+        return False
+    revoked_tokens.add(jti, expires_at)
+    return True
+
+
+def is_token_revoked(jti: str) -> bool:
+    """Return True if the JTI has been revoked (in-process set, no query)."""
+    return jti in revoked_tokens
+
+
+def purge_expired_revoked_tokens(db: Session, batch_size: int = 1000) -> int:
+    """
+    Delete revocations of tokens that have expired anyway, in batches. Rows
+    from before `expires_at` existed are kept for the refresh token lifetime.
+    """
+    table = models.RevokedToken.__table__
+    now = datetime.utcnow()
+    removed = 0
+    while True:
+        expired = (
+            select(table.c.id)
+            .where(
+                or_(
+                    table.c.expires_at <= now,
+                    and_(
+                        table.c.expires_at.is_(None),
+                        table.c.revoked_at <= now - timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+                    ),
+                )
+            )
+            .limit(batch_size)
+        )
+        deleted = db.execute(delete(table).where(table.c.id.in_(expired))).rowcount
         db.commit()
+        removed += deleted
+        if deleted < batch_size:
+            return removed
 
 
-def is_token_revoked(db: Session, jti: str) -> bool:
-    """Return True if JTI is present in revoked table."""
-    return db.query(models.RevokedToken).filter_by(jti=jti).first() is not None
+def token_expiry(payload: dict) -> Optional[datetime]:
+    """The `exp` claim of a decoded token as a naive UTC datetime."""
+    exp = payload.get("exp")
+    return datetime.utcfromtimestamp(exp) if exp else None
 
 
 # ========================
@@ -113,14 +229,14 @@ def decode_refresh_token(token: str, db: Session):
     - checks blacklist
     Returns payload on success or raises HTTPException.
     """
-    payload = _decode(token, REFRESH_TOKEN_SECRET_KEY)
+    payload = _decode(token, REFRESH_TOKEN_SECRET_KEY, audience="mtca-refresh")
     username = payload.get("sub")
     jti = payload.get("jti")
     if username is None or jti is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
         )
-    if is_token_revoked(db, jti):
+    if is_token_revoked(jti):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token has been revoked",
@@ -157,7 +273,7 @@ def get_current_user(
         raise credentials_exception
 
     # blacklist check
-    if is_token_revoked(db, jti):
+    if is_token_revoked(jti):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked"
         )
@@ -172,3 +288,27 @@ def get_current_admin(current_user: models.User = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admins only")
     return current_user
+
+
+def get_events_admin(
+    token: Optional[str] = Query(None, description="Token from POST /orders/events/token"),
+    bearer: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db),
+):
+    """Admin for the SSE feed: a `?token=` events token, or a normal Bearer token."""
+    if token is None:
+        if bearer is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return get_current_admin(get_current_user(bearer, db))
+
+    payload = _decode(token, ACCESS_TOKEN_SECRET_KEY, audience="mtca-events")
+    user = crud.get_user_by_username(db, payload.get("sub") or "")
+    if user is None or is_token_revoked(payload.get("jti")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid events token"
+        )
+    return get_current_admin(user)
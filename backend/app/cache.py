@@ -0,0 +1,106 @@
+# app/cache.py
+"""Small thread-safe LRU cache with TTL and hit/miss counters."""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0  # bumped by every invalidation
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, count: bool = True) -> Optional[Any]:
+        """Return the cached value or None; `count=False` skips the hit/miss counters."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += count
+                return None
+            self._data.move_to_end(key)
+            self.hits += count
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Drop every entry for which ``predicate(key, value)`` is true."""
+        with self._lock:
+            self.generation += 1
+            stale = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# GET /orders/{code} payloads keyed by normalized code; values are
+# (orders version, payload)
+order_cache = LRUCache(
+    maxsize=int(os.getenv("ORDER_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("ORDER_CACHE_TTL", 30)),
+)
+
+# GET /stats payloads keyed by (range, start_date, end_date); values are
+# (first_day, last_day, payload) with None for an open end
+stats_cache = LRUCache(
+    maxsize=int(os.getenv("STATS_CACHE_SIZE", 64)),
+    ttl=float(os.getenv("STATS_CACHE_TTL", 300)),
+)
+# "day"/"week" windows move with the clock, so they expire sooner
+STATS_CACHE_MOVING_TTL = float(os.getenv("STATS_CACHE_MOVING_TTL", 30))
+
+
+def invalidate_stats(days: Iterable[str]) -> int:
+    """Drop cached stats whose window contains any of `days` (YYYY-MM-DD)."""
+    days = sorted(days)
+    if not days:
+        return 0
+
+    def covers(key, entry):
+        first, last = entry[0], entry[1]
+        return any(
+            (first is None or first <= day) and (last is None or day <= last)
+            for day in days
+        )
+
+    return stats_cache.invalidate_where(covers)
@@ -0,0 +1,56 @@
+# app/catalog.py
+"""
+Pre-serialized product catalog for GET /products/.
+
+The JSON body is built once per "products" version (see crud.bump_versions)
+and served as bytes until a product write bumps the version. Because the
+version lives in the database, every worker notices changes made by others.
+"""
+import json
+import threading
+from typing import Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+
+class CatalogSnapshot:
+    def __init__(self):
+        self.version = None
+        self.body = b"[]"
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> Tuple[int, bytes]:
+        """Return ``(version, json_bytes)``, rebuilding if the catalog changed."""
+        version = crud.get_versions(db, "products")["products"]
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    # read after the version, so the body is never older than its label
+                    self.body = self._serialize(db)
+                    self.version = version
+        return self.version, self.body
+
+    @staticmethod
+    def _serialize(db: Session) -> bytes:
+        product = models.Product.__table__
+        rows = db.execute(
+            select(
+                product.c.name,
+                product.c.price,
+                product.c.description,
+                product.c.quantity,
+                product.c.image_url,
+                product.c.id,
+                product.c.thumbnail_url,
+            ).order_by(product.c.id)
+        )
+        # same shape and field order as schemas.ProductResponse
+        return json.dumps(
+            [row._asdict() for row in rows], separators=(",", ":")
+        ).encode()
+
+
+catalog = CatalogSnapshot()
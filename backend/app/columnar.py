@@ -0,0 +1,225 @@
+# app/columnar.py
+"""
+Optional columnar copy of collected order lines for GET /stats
+(STATS_BACKEND=columnar, requires NumPy).
+
+Lines are held as parallel NumPy columns: `ts` (epoch seconds of created_at),
+`product_id`, `quantity`, `revenue` and `first` (1 on exactly one line per
+order, so order counts are sums). Stats are then vectorized masks, bincounts
+and argsorts instead of SQL scans.
+
+The columns are saved to STATS_SNAPSHOT_DIR by the maintenance loop and on
+shutdown, and memory-mapped on the next start. Each collect stamps its order
+headers with the next "collect_seq" counter value; `sync` appends lines
+collected after the highest seq already loaded, so every worker picks up
+collects made by the others.
+"""
+import calendar
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Integer, cast, func, select, union_all
+
+from . import models
+
+try:
+    import numpy as np
+except ImportError:  # the columnar backend is optional
+    np = None
+
+STATS_SNAPSHOT_DIR = os.getenv(
+    "STATS_SNAPSHOT_DIR",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "stats_snapshot"
+    ),
+)
+
+COLUMNS = {
+    "ts": "int64",
+    "product_id": "int64",
+    "quantity": "int64",
+    "revenue": "float64",
+    "first": "int8",
+}
+_META = "meta.json"
+_LINE_COLUMNS = ("code", "product_id", "quantity", "created_at", "line_total")
+
+
+def _epoch(dt) -> int:
+    return calendar.timegm(dt.timetuple())
+
+
+def _empty() -> Dict:
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+class ColumnStore:
+    def __init__(self):
+        self.enabled = False
+        self.watermark = 0  # highest collect_seq loaded
+        self._base: Dict = {}  # memory-mapped snapshot columns
+        self._chunks: List[Dict] = []  # lines appended since the snapshot
+        self._lock = threading.Lock()
+
+    def load(self, db):
+        """Memory-map the snapshot (or build from the database), then catch up."""
+        if np is None:
+            raise RuntimeError("STATS_BACKEND=columnar requires numpy")
+        with self._lock:
+            if self.enabled:
+                return
+            if not self._load_snapshot():
+                self._base, self._chunks, self.watermark = _empty(), [], 0
+                self._append(db, initial=True)
+            self.enabled = True
+        self.sync(db)
+
+    def sync(self, db):
+        """Append lines collected since the last sync (cheap when nothing changed)."""
+        with self._lock:
+            self._append(db, initial=False)
+
+    def _append(self, db, initial: bool):
+        order = models.Order.__table__
+        archived = models.ArchivedOrder.__table__
+        header = models.OrderHeader.__table__
+        if initial:
+            condition = header.c.collected.is_(True)
+        else:
+            # one statement sees whole collects in seq order, so this never double counts
+            condition = header.c.collected_seq > self.watermark
+        codes = select(header.c.code).where(condition)
+        lines = union_all(
+            *(
+                select(*(table.c[name] for name in _LINE_COLUMNS)).where(
+                    table.c.code.in_(codes)
+                )
+                for table in (order, archived)
+            )
+        ).subquery("order_lines")
+
+        query = (
+            select(
+                cast(func.strftime("%s", lines.c.created_at), Integer),
+                lines.c.product_id,
+                lines.c.quantity,
+                lines.c.line_total,
+                lines.c.code,
+                header.c.collected_seq,
+            )
+            .select_from(lines.join(header, header.c.code == lines.c.code))
+            .where(condition)
+            .order_by(header.c.id)
+            .execution_options(yield_per=50000)
+        )
+
+        previous = None
+        for batch in db.execute(query).partitions():
+            ts, product_id, quantity, revenue, codes, seqs = zip(*batch)
+            first = [code != prev for code, prev in zip(codes, (previous,) + codes[:-1])]
+            previous = codes[-1]
+            self._chunks.append(
+                {
+                    "ts": np.array(ts, dtype=COLUMNS["ts"]),
+                    "product_id": np.array(product_id, dtype=COLUMNS["product_id"]),
+                    "quantity": np.array(quantity, dtype=COLUMNS["quantity"]),
+                    "revenue": np.array(
+                        [r or 0.0 for r in revenue], dtype=COLUMNS["revenue"]
+                    ),
+                    "first": np.array(first, dtype=COLUMNS["first"]),
+                }
+            )
+            self.watermark = max([self.watermark] + [s for s in seqs if s is not None])
+
+    def _segments(self) -> List[Dict]:
+        with self._lock:
+            if len(self._chunks) > 1:
+                self._chunks = [
+                    {
+                        name: np.concatenate([chunk[name] for chunk in self._chunks])
+                        for name in COLUMNS
+                    }
+                ]
+            return [self._base] + self._chunks
+
+    def stats(
+        self, start=None, end=None, top: int = 5
+    ) -> Tuple[int, float, List[Tuple[str, float]], List[Tuple[int, int, float]]]:
+        """(total_orders, total_revenue, [(month, revenue)], [(product_id, quantity, revenue)])."""
+        columns = {name: [] for name in COLUMNS}
+        for segment in self._segments():
+            mask = np.ones(len(segment["ts"]), dtype=bool)
+            if start is not None:
+                mask &= segment["ts"] >= _epoch(start)
+            if end is not None:
+                mask &= segment["ts"] <= _epoch(end)
+            for name in COLUMNS:
+                columns[name].append(segment[name][mask])
+        col = {name: np.concatenate(parts) for name, parts in columns.items()}
+        if not len(col["ts"]):
+            return 0, 0.0, [], []
+
+        months = col["ts"].astype("datetime64[s]").astype("datetime64[M]")
+        month_keys, month_index = np.unique(months, return_inverse=True)
+        month_revenue = np.bincount(month_index, weights=col["revenue"])
+
+        product_ids, product_index = np.unique(col["product_id"], return_inverse=True)
+        sold = np.bincount(product_index, weights=col["quantity"])
+        product_revenue = np.bincount(product_index, weights=col["revenue"])
+        best = np.argsort(-sold, kind="stable")[:top]
+
+        return (
+            int(col["first"].sum()),
+            float(col["revenue"].sum()),
+            [(str(m), float(r)) for m, r in zip(month_keys, month_revenue)],
+            [(int(product_ids[i]), int(sold[i]), float(product_revenue[i])) for i in best],
+        )
+
+    def save(self):
+        """Write the columns to STATS_SNAPSHOT_DIR and re-map them from there."""
+        if not self.enabled:
+            return
+        with self._lock:
+            os.makedirs(STATS_SNAPSHOT_DIR, exist_ok=True)
+            segments = [self._base] + self._chunks
+            files = {}
+            for name in COLUMNS:
+                files[name] = f"{name}.{self.watermark}.npy"
+                path = os.path.join(STATS_SNAPSHOT_DIR, files[name])
+                part = f"{path}.{os.getpid()}.part"
+                with open(part, "wb") as f:
+                    np.save(f, np.concatenate([segment[name] for segment in segments]))
+                os.replace(part, path)
+            meta = os.path.join(STATS_SNAPSHOT_DIR, _META)
+            part = f"{meta}.{os.getpid()}.part"
+            with open(part, "w") as f:
+                json.dump({"watermark": self.watermark, "files": files}, f)
+            os.replace(part, meta)
+
+            for entry in os.listdir(STATS_SNAPSHOT_DIR):
+                if entry.endswith(".npy") and entry not in files.values():
+                    os.remove(os.path.join(STATS_SNAPSHOT_DIR, entry))
+            self._load_snapshot()
+
+    def _load_snapshot(self) -> bool:
+        try:
+            with open(os.path.join(STATS_SNAPSHOT_DIR, _META)) as f:
+                meta = json.load(f)
+            base = {
+                name: np.load(
+                    os.path.join(STATS_SNAPSHOT_DIR, meta["files"][name]), mmap_mode="r"
+                )
+                for name in COLUMNS
+            }
+        except (OSError, ValueError, KeyError) as e:
+            print("No usable stats snapshot, rebuilding:", e)
+            return False
+        if len({len(column) for column in base.values()}) != 1:
+            return False
+        self._base, self._chunks, self.watermark = base, [], meta["watermark"]
+        return True
+
+
+store = ColumnStore()
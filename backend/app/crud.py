@@ -1,18 +1,46 @@
 # app/crud.py
 from typing import List, Dict, Optional
-from datetime import datetime
-import random
-import string
+from datetime import datetime, timedelta
+import base64
+import hashlib
+import json
+import os
+import re
+import secrets
 
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy import (
+    String,
+    and_,
+    bindparam,
+    delete,
+    func,
+    column,
+    insert,
+    literal_column,
+    or_,
+    select,
+    table,
+    type_coerce,
+    update,
+)
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from fastapi import HTTPException, status
 
-from . import models, schemas
+from . import columnar, events, models, order_codes, rollups, schemas
+from .cache import invalidate_stats, order_cache, stats_cache
+from .aggregation import OrderLine, line_total_expr, order_lines, unit_price_expr
 
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+BULK_IMPORT_CHUNK_SIZE = int(os.getenv("BULK_IMPORT_CHUNK_SIZE", 1000))
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", 50000))
+ORDER_CODE_KEY = os.getenv("ORDER_CODE_KEY")
+
+_order_code_key: Optional[bytes] = None
+
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -50,6 +78,78 @@ def get_all_products(db: Session) -> List[models.Product]:
     return db.query(models.Product).all()
 
 
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", text))
+
+
+def search_products(
+    db: Session,
+    q: Optional[str] = None,
+    limit: int = 24,
+    cursor: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: bool = False,
+):
+    """
+    Ranked full-text search over product name/description (FTS5), or the plain
+    catalog by id when `q` is empty. Keyset-paginated; returns
+    ``(products, next_cursor)``.
+    """
+    product = models.Product
+    match = _fts_query(q or "")
+
+    if match:
+        fts = table("products_fts", column("rowid"))
+        rank = func.bm25(literal_column("products_fts"))
+        query = (
+            db.query(product, rank.label("rank"))
+            .join(fts, fts.c.rowid == product.id)
+            .filter(literal_column("products_fts").op("MATCH")(match))
+        )
+        order = (rank, product.id)
+    else:
+        rank = None
+        query = db.query(product)
+        order = (product.id,)
+
+    if min_price is not None:
+        query = query.filter(product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(product.price <= max_price)
+    if in_stock:
+        query = query.filter(product.quantity > 0)
+
+    if cursor:
+        if rank is not None:
+            cursor_rank, cursor_id = _decode_cursor(cursor)
+            query = query.filter(
+                or_(
+                    rank > cursor_rank,
+                    and_(rank == cursor_rank, product.id > cursor_id),
+                )
+            )
+        else:
+            (cursor_id,) = _decode_cursor(cursor, size=1)
+            query = query.filter(product.id > cursor_id)
+
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = (
+            _encode_cursor(last.rank, last[0].id)
+            if rank is not None
+            else _encode_cursor(last.id)
+        )
+
+    products = [row[0] for row in rows] if rank is not None else rows
+    return products, next_cursor
+
+
 def get_product(db: Session, product_id: int):
     return db.query(models.Product).filter(models.Product.id == product_id).first()
 
@@ -57,6 +157,7 @@ def get_product(db: Session, product_id: int):
 def create_product(db: Session, product_data: Dict):
     product = models.Product(**product_data)
     db.add(product)
+    bump_versions(db, "products")
     db.commit()
     db.refresh(product)
     return product
@@ -67,8 +168,28 @@ def update_product(db: Session, product_id: int, update_data: schemas.ProductUpd
     if not product:
         return None
     update_dict = update_data.dict(exclude_unset=True)
+    renamed = update_dict.get("name", product.name) != product.name
     for key, value in update_dict.items():
         setattr(product, key, value)
+    # order payloads (and so their ETags) and stats embed product names
+    bump_versions(db, "products", *(["orders", "stats"] if renamed else []))
+    db.commit()
+    if renamed:
+        order_cache.clear()
+        stats_cache.clear()
+    db.refresh(product)
+    return product
+
+
+def set_product_image(
+    db: Session, product_id: int, image_url: str, thumbnail_url: Optional[str]
+):
+    product = get_product(db, product_id)
+    if not product:
+        return None
+    product.image_url = image_url
+    product.thumbnail_url = thumbnail_url
+    bump_versions(db, "products")
     db.commit()
     db.refresh(product)
     return product
@@ -79,52 +200,378 @@ def delete_product(db: Session, product_id: int):
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Check for existing orders
-    if db.query(models.Order).filter(models.Order.product_id == product_id).first():
+    # Check for existing orders (live or archived)
+    if (
+        db.query(models.Order.id).filter(models.Order.product_id == product_id).first()
+        or db.query(models.ArchivedOrder.id)
+        .filter(models.ArchivedOrder.product_id == product_id)
+        .first()
+    ):
         raise HTTPException(
             status_code=400, detail="Cannot delete product with existing orders"
         )
 
     db.delete(product)
+    bump_versions(db, "products")
     db.commit()
     return {"message": "Product deleted successfully"}
 
 
-def generate_order_code(db: Session):
-    characters = string.ascii_uppercase + string.digits
+def _validation_message(error: ValueError) -> str:
+    if not hasattr(error, "errors"):
+        return str(error)
+    return "; ".join(
+        f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors()
+    )
+
+
+def _plan_product_chunk(db: Session, chunk, errors: List[Dict]):
+    """Split validated rows into (updates, inserts), reporting unresolvable ones."""
+    product = models.Product.__table__
+    ids = {fields["id"] for _, fields in chunk if "id" in fields}
+    names = {
+        fields["name"] for _, fields in chunk if "id" not in fields and "name" in fields
+    }
+    existing = (
+        set(db.execute(select(product.c.id).where(product.c.id.in_(ids))).scalars())
+        if ids
+        else set()
+    )
+    by_name: Dict[str, List[int]] = {}
+    if names:
+        for pid, name in db.execute(
+            select(product.c.id, product.c.name).where(product.c.name.in_(names))
+        ):
+            by_name.setdefault(name, []).append(pid)
+
+    updates, inserts, new_names = [], [], set()
+    for n, fields in chunk:
+        pid = fields.pop("id", None)
+        if pid is None:
+            name = fields.get("name")
+            matches = by_name.get(name, [])
+            if name is None:
+                errors.append({"row": n, "error": "id or name is required"})
+                continue
+            if len(matches) > 1:
+                errors.append(
+                    {"row": n, "error": f"Name {name!r} matches several products; use id"}
+                )
+                continue
+            if matches:
+                pid = matches[0]
+            elif "price" not in fields or "quantity" not in fields:
+                errors.append(
+                    {"row": n, "error": "price and quantity are required for new products"}
+                )
+                continue
+            elif name in new_names:
+                errors.append({"row": n, "error": f"Duplicate new product {name!r}"})
+                continue
+            else:
+                new_names.add(name)
+                inserts.append((n, fields))
+                continue
+        elif pid not in existing:
+            errors.append({"row": n, "error": f"Product {pid} not found"})
+            continue
+        if fields:
+            updates.append((n, pid, fields))
+    return updates, inserts
+
+
+def bulk_upsert_products(
+    db: Session, rows: List[Dict], chunk_size: int = BULK_IMPORT_CHUNK_SIZE
+) -> Dict:
+    """
+    Apply product upserts (see schemas.ProductUpsert) with executemany, one
+    transaction per chunk. Invalid rows are reported in `errors` rather than
+    failing the import, and the "products" version is bumped once at the end.
+    Null/blank fields are left unchanged.
+    """
+    product = models.Product.__table__
+    inserted = updated = 0
+    errors: List[Dict] = []
+    renamed = False
+
+    for offset in range(0, len(rows), chunk_size):
+        chunk = []
+        for n, raw in enumerate(rows[offset : offset + chunk_size], start=offset + 1):
+            try:
+                row = schemas.ProductUpsert.parse_obj(raw)
+            except ValueError as e:
+                errors.append({"row": n, "error": _validation_message(e)})
+                continue
+            chunk.append((n, row.dict(exclude_none=True)))
+
+        updates, inserts = _plan_product_chunk(db, chunk, errors)
+
+        # executemany needs one statement per distinct set of columns
+        groups: Dict[tuple, List[Dict]] = {}
+        for _, pid, fields in updates:
+            params = {f"b_{key}": value for key, value in fields.items()}
+            params["b_id"] = pid
+            groups.setdefault(tuple(sorted(fields)), []).append(params)
+        try:
+            for keys, params in groups.items():
+                db.execute(
+                    update(product)
+                    .where(product.c.id == bindparam("b_id"))
+                    .values({key: bindparam(f"b_{key}") for key in keys}),
+                    params,
+                )
+            if inserts:
+                db.execute(
+                    insert(product),
+                    [
+                        {
+                            "name": fields["name"],
+                            "price": fields["price"],
+                            "quantity": fields["quantity"],
+                            "description": fields.get("description", ""),
+                            "image_url": fields.get("image_url"),
+                        }
+                        for _, fields in inserts
+                    ],
+                )
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            message = f"Database error; chunk not applied: {getattr(e, 'orig', None) or e}"
+            for n in sorted([n for n, _, _ in updates] + [n for n, _ in inserts]):
+                errors.append({"row": n, "error": message})
+            continue
+        updated += len(updates)
+        inserted += len(inserts)
+        renamed = renamed or any("name" in keys for keys in groups)
+
+    if inserted or updated:
+        # order payloads (and so their ETags) and stats embed product names
+        bump_versions(db, "products", *(["orders", "stats"] if renamed else []))
+        db.commit()
+        if renamed:
+            order_cache.clear()
+            stats_cache.clear()
+
+    errors.sort(key=lambda e: e["row"])
+    return {"inserted": inserted, "updated": updated, "errors": errors}
+
+
+def next_counter_value(db: Session, name: str) -> int:
+    """Increment and return a named counter inside the caller's transaction."""
+    counter = models.Counter.__table__
+    bumped = db.execute(
+        update(counter)
+        .where(counter.c.name == name)
+        .values(value=counter.c.value + 1)
+    )
+    if bumped.rowcount == 0:
+        try:
+            with db.begin_nested():
+                db.execute(insert(counter).values(name=name, value=1))
+            return 1
+        except IntegrityError:
+            # another transaction created it first
+            return next_counter_value(db, name)
+    return db.execute(select(counter.c.value).where(counter.c.name == name)).scalar()
+
+
+def bump_versions(db: Session, *names: str):
+    """Bump the cache-validation versions for `names` (e.g. "products") before commit."""
+    for name in names:
+        next_counter_value(db, f"version:{name}")
+
+
+def get_versions(db: Session, *names: str) -> Dict[str, int]:
+    counter = models.Counter.__table__
+    keys = {f"version:{name}": name for name in names}
+    rows = db.execute(
+        select(counter.c.name, counter.c.value).where(counter.c.name.in_(list(keys)))
+    )
+    versions = {name: 0 for name in names}
+    for key, value in rows:
+        versions[keys[key]] = value
+    return versions
+
+
+def order_code_key(db: Session) -> bytes:
+    """
+    The order code permutation key: ORDER_CODE_KEY if set, otherwise a random
+    key created on first use and stored as the "order_code_key" counter row.
+
+    A new key is committed on its own connection and read back before it is
+    cached, so a rollback of the caller's transaction can't lose it; call this
+    before the caller's transaction writes (SQLite allows one writer).
+    """
+    global _order_code_key
+    if _order_code_key is not None:
+        return _order_code_key
+    if ORDER_CODE_KEY:
+        _order_code_key = ORDER_CODE_KEY.encode()
+        return _order_code_key
+
+    counter = models.Counter.__table__
+    stored = select(counter.c.value).where(counter.c.name == "order_code_key")
+    value = db.execute(stored).scalar()
+    if value is None:
+        engine = db.get_bind()
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    insert(counter).values(
+                        name="order_code_key", value=secrets.randbits(62)
+                    )
+                )
+        except IntegrityError:
+            pass  # another worker created it first
+        with engine.connect() as conn:
+            value = conn.execute(stored).scalar()
+    _order_code_key = value.to_bytes(8, "big")
+    return _order_code_key
+
+
+def create_order_header(db: Session, user_id: Optional[int] = None) -> models.OrderHeader:
+    """
+    Allocate a unique order code and insert its header row (totals filled in by
+    the caller before commit). Codes come from a keyed permutation of a counter,
+    so no lookups against existing orders are needed.
+    """
+    key = order_code_key(db)  # before the counter takes the write lock
     while True:
-        code = "".join(random.choices(characters, k=6))
-        existing_order = (
-            db.query(models.Order).filter(models.Order.code == code).first()
+        code = order_codes.code_for(next_counter_value(db, "order_code"), key)
+        header = models.OrderHeader(
+            code=code, user_id=user_id, total=0.0, item_count=0, collected=False
+        )
+        try:
+            with db.begin_nested():
+                db.add(header)
+                db.flush()
+            return header
+        except IntegrityError:
+            # only possible against pre-existing randomly generated codes
+            continue
+
+
+def order_request_hash(orders: List[schemas.OrderCreate]) -> str:
+    """Fingerprint of a checkout body, stored with its Idempotency-Key."""
+    body = json.dumps(
+        [order.dict() for order in orders], sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def get_idempotent_response(
+    db: Session, user_id: Optional[int], key: str, request_hash: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    The stored response for (user, key), or None if unknown or expired.
+    Reusing a key with a different request body is a 422.
+    """
+    record = (
+        db.query(models.IdempotencyKey)
+        .filter(
+            models.IdempotencyKey.user_id == user_id,
+            models.IdempotencyKey.key == key,
         )
-        if not existing_order:
-            return code
+        .first()
+    )
+    if not record:
+        return None
+    if record.expires_at <= datetime.utcnow():
+        # free the key for reuse without waiting for the purge job
+        db.delete(record)
+        db.commit()
+        return None
+    # keys stored before request hashes were recorded match any body
+    if request_hash and record.request_hash and record.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    return json.loads(record.response)
+
+
+def purge_expired_idempotency_keys(db: Session, batch_size: int = 1000) -> int:
+    """Delete expired idempotency keys in batches; returns the number removed."""
+    table = models.IdempotencyKey.__table__
+    removed = 0
+    while True:
+        expired = (
+            select(table.c.id)
+            .where(table.c.expires_at <= datetime.utcnow())
+            .limit(batch_size)
+        )
+        deleted = db.execute(delete(table).where(table.c.id.in_(expired))).rowcount
+        db.commit()
+        removed += deleted
+        if deleted < batch_size:
+            return removed
 
 
 def create_orders(
-    db: Session, orders: List[schemas.OrderCreate], user_id: Optional[int] = None
+    db: Session,
+    orders: List[schemas.OrderCreate],
+    user_id: Optional[int] = None,
+    idempotency_key: Optional[str] = None,
 ):
     if not orders:
         raise HTTPException(status_code=400, detail="No order items provided")
 
-    order_code = generate_order_code(db)
-    total = 0.0
-    order_items = []
-
+    # load the whole cart in one query
+    requested: Dict[int, int] = {}
     for order_data in orders:
-        product = get_product(db, order_data.product_id)
-        if not product:
+        requested[order_data.product_id] = (
+            requested.get(order_data.product_id, 0) + order_data.quantity
+        )
+    products = {
+        p.id: p
+        for p in db.query(models.Product)
+        .filter(models.Product.id.in_(list(requested)))
+        .all()
+    }
+    for product_id in requested:
+        if product_id not in products:
             raise HTTPException(
-                status_code=404, detail=f"Product {order_data.product_id} not found"
+                status_code=404, detail=f"Product {product_id} not found"
             )
 
-        if product.quantity < order_data.quantity:
-            raise HTTPException(
-                status_code=400, detail=f"Insufficient quantity for {product.name}"
+    header = create_order_header(db, user_id)
+    order_code = header.code
+    total = 0.0
+    order_items = []
+
+    # reserve stock atomically: each UPDATE only applies if enough is left
+    product_table = models.Product.__table__
+    reserve = (
+        update(product_table)
+        .where(
+            product_table.c.id == bindparam("product_id"),
+            product_table.c.quantity >= bindparam("requested"),
+        )
+        .values(quantity=product_table.c.quantity - bindparam("requested"))
+    )
+    reserved = db.execute(
+        reserve,
+        [{"product_id": pid, "requested": qty} for pid, qty in requested.items()],
+    )
+    if reserved.rowcount != len(requested):
+        db.rollback()
+        in_stock = dict(
+            db.query(models.Product.id, models.Product.quantity).filter(
+                models.Product.id.in_(list(requested))
             )
+        )
+        short = next(
+            (pid for pid, qty in requested.items() if (in_stock.get(pid) or 0) < qty),
+            next(iter(requested)),
+        )
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient quantity for {products[short].name}",
+        )
 
-        # decrement inventory
-        product.quantity -= order_data.quantity
+    for order_data in orders:
+        product = products[order_data.product_id]
 
         # snapshot the current product price
         unit_price = float(product.price or 0.0)
@@ -154,403 +601,339 @@ def create_orders(
             }
         )
 
-    db.commit()
+    # totals live on the header so reads don't re-aggregate the lines
+    header.total = round(total, 2)
+    header.item_count = len(order_items)
+    bump_versions(db, "orders", "products")
 
-    return {
+    result = {
         "code": order_code,
         "total": round(total, 2),
         "collected": False,
         "items": order_items,
     }
+    if idempotency_key:
+        # stored in the same transaction, so a retry sees either nothing or the finished order
+        db.add(
+            models.IdempotencyKey(
+                key=idempotency_key,
+                user_id=user_id,
+                response=json.dumps(result),
+                request_hash=order_request_hash(orders),
+                expires_at=datetime.utcnow()
+                + timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS),
+            )
+        )
+    try:
+        db.commit()
+    except IntegrityError:
+        # a concurrent request with the same key won the race
+        db.rollback()
+        if not idempotency_key:
+            raise
+        stored = get_idempotent_response(
+            db, user_id, idempotency_key, order_request_hash(orders)
+        )
+        if stored is None:
+            raise
+        return stored
+    order_cache.invalidate(order_code)
+
+    events.bus.publish(
+        "order.created",
+        {
+            "code": order_code,
+            "user_id": user_id,
+            "total": round(total, 2),
+            "item_count": len(order_items),
+        },
+    )
 
+    return result
 
-def mark_orders_collected_by_code(db: Session, code: str):
-    orders = db.query(models.Order).filter(models.Order.code == code).all()
-    if not orders:
-        raise HTTPException(status_code=404, detail="No orders found with that code")
-    for order in orders:
-        order.collected = True
-    db.commit()
-    return orders
 
+def mark_orders_collected(db: Session, codes: List[str]):
+    """
+    Mark every order in `codes` collected with set-based UPDATEs.
 
-def get_all_orders(db: Session) -> List[Dict]:
-    orders = (
-        db.query(models.Order)
-        .options(joinedload(models.Order.product), joinedload(models.Order.user))
-        .order_by(models.Order.created_at.desc())
-        .all()
+    Returns ``(updated, not_found)``: the number of orders that were still
+    pending, and the codes that don't exist. Already collected orders are left
+    as they are.
+    """
+    codes = list(dict.fromkeys(order_codes.normalize(code) for code in codes))
+    header = models.OrderHeader
+    states = dict(
+        db.query(header.code, header.collected).filter(header.code.in_(codes)).all()
+    )
+    not_found = [code for code in codes if code not in states]
+    pending = [code for code, collected in states.items() if not collected]
+    if not pending:
+        return 0, not_found
+
+    # only the codes this transaction flips count, so rollups never double-add;
+    # IS NOT keeps the planner on the unique code index rather than `collected`
+    header_table = header.__table__
+    seq = next_counter_value(db, "collect_seq")
+    pending = list(
+        db.execute(
+            update(header_table)
+            .where(header_table.c.code.in_(pending), header_table.c.collected.isnot(True))
+            .values(collected=True, collected_seq=seq)
+            .returning(header_table.c.code)
+        ).scalars()
+    )
+    if not pending:
+        db.rollback()
+        return 0, not_found
+    db.query(models.Order).filter(models.Order.code.in_(pending)).update(
+        {models.Order.collected: True}, synchronize_session=False
     )
+    days = rollups.apply_collected(db, pending)
+    bump_versions(db, "orders", "stats")
+    db.commit()
+    order_cache.invalidate(*pending)
+    invalidate_stats(days)
+    if columnar.store.enabled:
+        columnar.store.sync(db)
 
-    grouped: Dict[str, Dict] = {}
-
-    for ord_row in orders:
-        code = ord_row.code or "UNKNOWN"
-        if code not in grouped:
-            user_obj = getattr(ord_row, "user", None)
-            grouped[code] = {
-                "code": code,
-                "items": [],
-                "total": 0.0,
-                "collected": True,
-                "created_at": getattr(ord_row, "created_at", None),
-                "user": (
-                    {
-                        "id": getattr(user_obj, "id", None),
-                        "username": getattr(user_obj, "username", None),
-                    }
-                    if user_obj
-                    else None
-                ),
-            }
+    for code in pending:
+        events.bus.publish("order.collected", {"code": code})
+    return len(pending), not_found
 
-        product = getattr(ord_row, "product", None)
-        product_name = getattr(product, "name", "Unknown") if product else "Unknown"
 
-        # Prefer snapshot unit_price/line_total on the order row; fall back to product.price/total_amount
-        unit_price = getattr(ord_row, "unit_price", None)
-        line_total = getattr(ord_row, "line_total", None)
-        row_total_amount = getattr(ord_row, "total_amount", None)
-        quantity = getattr(ord_row, "quantity", 0)
+def mark_orders_collected_by_code(db: Session, code: str) -> int:
+    updated, not_found = mark_orders_collected(db, [code])
+    if not_found:
+        raise HTTPException(status_code=404, detail="No orders found with that code")
+    return updated
 
-        if unit_price is not None and not (
-            unit_price == 0 and line_total is None and row_total_amount is None
-        ):
-            subtotal = round(unit_price * (quantity or 0), 2)
-            grouped[code]["items"].append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": float(unit_price),
-                    "subtotal": float(subtotal),
-                }
-            )
-            grouped[code]["total"] += subtotal
-        elif line_total is not None:
-            grouped[code]["items"].append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": float(unit_price) if unit_price is not None else None,
-                    "subtotal": float(line_total),
-                }
-            )
-            grouped[code]["total"] += float(line_total or 0.0)
-        elif getattr(product, "price", None) is not None:
-            # last-resort: use product price (should not be used for historical correctness if snapshot exists)
-            price = float(getattr(product, "price", 0.0))
-            subtotal = round(price * (quantity or 0), 2)
-            grouped[code]["items"].append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": price,
-                    "subtotal": subtotal,
-                }
-            )
-            grouped[code]["total"] += subtotal
-        else:
-            # fallback to stored row total_amount
-            grouped[code]["items"].append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "subtotal": float(row_total_amount or 0.0),
-                }
-            )
-            grouped[code]["total"] += float(row_total_amount or 0.0)
-
-        # If grouped user is empty, try set from this row (first non-null)
-        if not grouped[code].get("user"):
-            u = getattr(ord_row, "user", None)
-            grouped[code]["user"] = (
-                {"id": getattr(u, "id", None), "username": getattr(u, "username", None)}
-                if u
-                else None
-            )
 
-        # only true if all rows are collected
-        grouped[code]["collected"] = grouped[code]["collected"] and bool(
-            ord_row.collected
-        )
+def _encode_cursor(*values) -> str:
+    raw = json.dumps(list(values)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, size: int = 2) -> List:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
 
-        # prefer earliest non-null created_at (we set on creation above)
-        if grouped[code]["created_at"] is None:
-            grouped[code]["created_at"] = getattr(ord_row, "created_at", None)
+def _header_lines(
+    db: Session, headers: List[models.OrderHeader]
+) -> Dict[str, List[OrderLine]]:
+    """Line items for the headers, read from the archive for archived orders."""
+    lines = order_lines(db, [h.code for h in headers if not h.archived])
+    archived = [h.code for h in headers if h.archived]
+    if archived:
+        lines.update(order_lines(db, archived, models.ArchivedOrder.__table__))
+    return lines
 
-    results = list(grouped.values())
-    # sort by created_at desc (newest first)
-    results.sort(key=lambda x: x.get("created_at") or datetime.min, reverse=True)
 
-    # round totals and ensure types are JSON-safe
-    for r in results:
-        r["total"] = round(r.get("total", 0.0) or 0.0, 2)
+def _order_detail(
+    header: models.OrderHeader, lines: List[OrderLine], with_user: bool = True
+):
+    detail = {
+        "code": header.code,
+        "items": [line.as_item() for line in lines],
+        "total": round(header.total or 0.0, 2),
+        "collected": bool(header.collected),
+        "created_at": header.created_at,
+    }
+    if with_user:
+        user_obj = header.user
+        detail["user"] = (
+            {"id": user_obj.id, "username": user_obj.username} if user_obj else None
+        )
+    return detail
 
-    return results
 
+def get_orders_page(
+    db: Session,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    collected: Optional[bool] = None,
+    user_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """
+    Keyset-paginated admin order listing, newest first.
+
+    Returns ``(orders, next_cursor)``. Only the codes on the requested page are
+    loaded; ``next_cursor`` is None on the last page.
+    """
+    header = models.OrderHeader
+    # created_at is kept as the raw stored string so the cursor round-trips exactly
+    created_at = type_coerce(header.created_at, String)
+
+    query = db.query(header, created_at.label("cursor_created_at")).options(
+        joinedload(header.user)
+    )
+    if user_id is not None:
+        query = query.filter(header.user_id == user_id)
+    if collected is not None:
+        query = query.filter(header.collected == collected)
+    if start is not None:
+        query = query.filter(header.created_at >= start)
+    if end is not None:
+        query = query.filter(header.created_at <= end)
+    if cursor:
+        cursor_created_at, cursor_code = _decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                created_at < cursor_created_at,
+                and_(created_at == cursor_created_at, header.code < cursor_code),
+            )
+        )
 
-def get_order_by_code(db: Session, code: str) -> Dict:
-    orders = (
-        db.query(models.Order)
-        .options(joinedload(models.Order.product), joinedload(models.Order.user))
-        .filter(models.Order.code == code)
-        .order_by(models.Order.created_at.asc())
+    rows = (
+        query.order_by(header.created_at.desc(), header.code.desc())
+        .limit(limit + 1)
         .all()
     )
 
-    if not orders:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].cursor_created_at, rows[-1][0].code)
+
+    headers = [row[0] for row in rows]
+    lines = _header_lines(db, headers)
+    return [_order_detail(h, lines[h.code]) for h in headers], next_cursor
+
+
+def get_order_by_code(db: Session, code: str, version: Optional[int] = None) -> Dict:
+    """
+    The order detail as of orders `version` (read now when not given). Cache
+    entries carry the version they were built at and are only served for that
+    version, so a collect on another worker is never hidden behind a new ETag.
+    """
+    code = order_codes.normalize(code)
+    if version is None:
+        version = get_versions(db, "orders")["orders"]
+    cached = order_cache.get(code)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    generation = order_cache.generation
+
+    # read after the version, so the detail is never older than its label
+    header = (
+        db.query(models.OrderHeader)
+        .options(joinedload(models.OrderHeader.user))
+        .filter(models.OrderHeader.code == code)
+        .first()
+    )
+
+    if not header:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Order with code {code} not found",
         )
 
-    items = []
-    total = 0.0
-    collected = True
-    created_at = None
-    user_obj = getattr(orders[0], "user", None)
-
-    for order in orders:
-        product = order.product
-        product_name = getattr(product, "name", "Unknown") if product else "Unknown"
-
-        unit_price = getattr(order, "unit_price", None)
-        line_total = getattr(order, "line_total", None)
-        total_amount = getattr(order, "total_amount", None)
-
-        quantity = getattr(order, "quantity", 0)
-
-        if unit_price is not None:
-            subtotal = round(unit_price * quantity, 2)
-            price_val = float(unit_price)
-            items.append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": price_val,
-                    "subtotal": float(subtotal),
-                }
-            )
-            total += subtotal
-        elif line_total is not None:
-            items.append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "subtotal": float(line_total),
-                }
-            )
-            total += float(line_total or 0.0)
-        elif getattr(product, "price", None) is not None:
-            price_val = float(getattr(product, "price", 0.0))
-            subtotal = round(price_val * quantity, 2)
-            items.append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": price_val,
-                    "subtotal": subtotal,
-                }
-            )
-            total += subtotal
-        else:
-            items.append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "subtotal": float(total_amount or 0.0),
-                }
-            )
-            total += float(total_amount or 0.0)
-
-        collected = collected and bool(order.collected)
-        created_at = created_at or getattr(order, "created_at", None)
-
-    return {
-        "code": code,
-        "items": items,
-        "total": round(total, 2),
-        "collected": collected,
-        "created_at": created_at,
-        "user": (
-            {
-                "id": getattr(user_obj, "id", None),
-                "username": getattr(user_obj, "username", None),
-            }
-            if user_obj
-            else None
-        ),
-    }
+    lines = _header_lines(db, [header])
+    detail = _order_detail(header, lines[header.code])
+    # skip storing if an order was invalidated meanwhile; this read may predate it
+    if order_cache.generation == generation:
+        order_cache.set(code, (version, detail))
+    return detail
 
 
 def get_user_orders_grouped(db: Session, user_id: int) -> List[Dict]:
-    orders = (
-        db.query(models.Order)
-        .options(joinedload(models.Order.product))
-        .filter(models.Order.user_id == user_id)
-        .order_by(models.Order.created_at.desc())
+    headers = (
+        db.query(models.OrderHeader)
+        .filter(models.OrderHeader.user_id == user_id)
+        .order_by(models.OrderHeader.created_at.desc(), models.OrderHeader.id.desc())
         .all()
     )
 
-    grouped: Dict[str, Dict] = {}
-
-    for ord_row in orders:
-        code = ord_row.code or "UNKNOWN"
-        if code not in grouped:
-            grouped[code] = {
-                "code": code,
-                "items": [],
-                "total": 0.0,
-                "collected": True,
-                "created_at": getattr(ord_row, "created_at", None),
-            }
-
-        product = getattr(ord_row, "product", None)
-        product_name = getattr(product, "name", "Unknown") if product else "Unknown"
-
-        unit_price = getattr(ord_row, "unit_price", None)
-        line_total = getattr(ord_row, "line_total", None)
-        total_amount = getattr(ord_row, "total_amount", None)
-        quantity = getattr(ord_row, "quantity", 0)
-
-        if unit_price is not None:
-            subtotal = round(unit_price * quantity, 2)
-            grouped[code]["items"].append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": float(unit_price),
-                    "subtotal": float(subtotal),
-                }
-            )
-            grouped[code]["total"] += subtotal
-        elif line_total is not None:
-            grouped[code]["items"].append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "subtotal": float(line_total),
-                }
-            )
-            grouped[code]["total"] += float(line_total or 0.0)
-        elif getattr(product, "price", None) is not None:
-            price = float(getattr(product, "price", 0.0))
-            subtotal = round(price * quantity, 2)
-            grouped[code]["items"].append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": price,
-                    "subtotal": subtotal,
-                }
-            )
-            grouped[code]["total"] += subtotal
-        else:
-            grouped[code]["items"].append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "subtotal": float(total_amount or 0.0),
-                }
-            )
-            grouped[code]["total"] += float(total_amount or 0.0)
-
-        grouped[code]["collected"] = grouped[code]["collected"] and bool(
-            ord_row.collected
-        )
-
-        if grouped[code]["created_at"] is None:
-            grouped[code]["created_at"] = getattr(ord_row, "created_at", None)
-
-    results = list(grouped.values())
-    results.sort(key=lambda x: x.get("created_at") or datetime.min, reverse=True)
-
-    for r in results:
-        r["total"] = round(r.get("total", 0.0) or 0.0, 2)
-
-    return results
+    lines = _header_lines(db, headers)
+    return [_order_detail(h, lines[h.code], with_user=False) for h in headers]
 
 
 def get_user_order_by_code(db: Session, user_id: int, code: str) -> Optional[Dict]:
-    normalized_code = code.strip().upper()
+    normalized_code = order_codes.normalize(code)
 
-    orders = (
-        db.query(models.Order)
-        .options(joinedload(models.Order.product))
+    header = (
+        db.query(models.OrderHeader)
         .filter(
-            models.Order.user_id == user_id,
-            func.upper(models.Order.code) == normalized_code,
+            models.OrderHeader.user_id == user_id,
+            models.OrderHeader.code == normalized_code,
         )
-        .order_by(models.Order.created_at.asc())
-        .all()
+        .first()
     )
 
-    if not orders:
+    if not header:
         return None
 
-    items = []
-    total = 0.0
-    collected = True
-    created_at = None
-
-    for o in orders:
-        product = o.product
-        product_name = getattr(product, "name", "Unknown") if product else "Unknown"
-
-        unit_price = getattr(o, "unit_price", None)
-        line_total = getattr(o, "line_total", None)
-        total_amount = getattr(o, "total_amount", None)
-        quantity = getattr(o, "quantity", 0)
-
-        if unit_price is not None:
-            subtotal = round(unit_price * quantity, 2)
-            items.append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": float(unit_price),
-                    "subtotal": float(subtotal),
-                }
-            )
-            total += subtotal
-        elif line_total is not None:
-            items.append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "subtotal": float(line_total),
-                }
-            )
-            total += float(line_total or 0.0)
-        elif getattr(product, "price", None) is not None:
-            price = float(getattr(product, "price", 0.0))
-            subtotal = round(price * quantity, 2)
-            items.append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "price": price,
-                    "subtotal": subtotal,
-                }
-            )
-            total += subtotal
-        else:
-            items.append(
-                {
-                    "product_name": product_name,
-                    "quantity": quantity,
-                    "subtotal": float(total_amount or 0.0),
-                }
+    lines = _header_lines(db, [header])
+    return _order_detail(header, lines[header.code], with_user=False)
+
+
+EXPORT_COLUMNS = [
+    "code",
+    "created_at",
+    "username",
+    "product_id",
+    "product_name",
+    "quantity",
+    "unit_price",
+    "line_total",
+    "collected",
+]
+
+
+def iter_order_export(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    collected: Optional[bool] = None,
+    batch_size: int = 1000,
+):
+    """
+    Yield order lines (as tuples in EXPORT_COLUMNS order) in batches, streamed
+    from a server-side cursor so memory stays flat regardless of history size.
+    Archived lines come first, then the live table.
+    """
+    for order in (models.ArchivedOrder.__table__, models.Order.__table__):
+        yield from _iter_export_table(db, order, start, end, collected, batch_size)
+
+
+def _iter_export_table(db, order, start, end, collected, batch_size):
+    product = models.Product.__table__
+    user = models.User.__table__
+
+    query = (
+        select(
+            order.c.code,
+            order.c.created_at,
+            user.c.username,
+            order.c.product_id,
+            func.coalesce(product.c.name, "Unknown"),
+            order.c.quantity,
+            unit_price_expr(order, product),
+            line_total_expr(order, product),
+            order.c.collected,
+        )
+        .select_from(
+            order.outerjoin(product, product.c.id == order.c.product_id).outerjoin(
+                user, user.c.id == order.c.user_id
             )
-            total += float(total_amount or 0.0)
-
-        collected = collected and bool(o.collected)
-        created_at = created_at or getattr(o, "created_at", None)
-
-    return {
-        "code": normalized_code,
-        "items": items,
-        "total": round(total, 2),
-        "collected": collected,
-        "created_at": created_at,
-    }
+        )
+        .order_by(order.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if start is not None:
+        query = query.where(order.c.created_at >= start)
+    if end is not None:
+        query = query.where(order.c.created_at <= end)
+    if collected is not None:
+        query = query.where(order.c.collected == collected)
+
+    for batch in db.execute(query).partitions():
+        yield batch
@@ -0,0 +1,113 @@
+# app/events.py
+"""
+In-process change feed for orders, consumed by the Server-Sent Events endpoint.
+
+Write paths in crud publish events after commit (from worker threads); each
+subscriber gets a bounded queue on the event loop. A subscriber that falls
+more than `queue_size` events behind is dropped and told to resync rather
+than buffering without limit. Recent events are kept so a reconnecting client
+can resume from its Last-Event-ID.
+
+Events only cover writes handled by this process; the SSE endpoint catches
+other workers' writes by checking `version:orders` every keep-alive tick.
+"""
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set
+
+SSE_RETRY_MS = 3000
+SSE_KEEPALIVE_SECONDS = 15
+
+
+class Event:
+    __slots__ = ("id", "seq", "type", "data")
+
+    def __init__(self, stream_id: str, seq: int, type: str, data: Dict):
+        self.id = f"{stream_id}-{seq}"
+        self.seq = seq
+        self.type = type
+        self.data = data
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+
+    def offer(self, event: Event):
+        """Runs on the subscriber's loop."""
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            # wake the reader so it can tell the client to resync
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[Event]:
+        return await self.queue.get()
+
+
+class EventBus:
+    def __init__(self, history: int = 1000, queue_size: int = 256):
+        self.stream_id = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history: Deque[Event] = deque(maxlen=history)
+        self._subscribers: Set[Subscriber] = set()
+
+    def publish(self, type: str, data: Dict) -> Event:
+        with self._lock:
+            self._seq += 1
+            event = Event(self.stream_id, self._seq, type, data)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, event)
+            except RuntimeError:
+                # loop already closed; the stream's finally block will unsubscribe
+                pass
+        return event
+
+    def subscribe(self, last_event_id: Optional[str] = None):
+        """
+        Register a subscriber on the running loop.
+
+        Returns ``(subscriber, backlog, complete)``: ``backlog`` holds the events
+        published after ``last_event_id`` and ``complete`` is False when that
+        id is unknown or has aged out, meaning the client must resync.
+        """
+        sub = Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            backlog, complete = self._since(last_event_id)
+            self._subscribers.add(sub)
+        return sub, backlog, complete
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def _since(self, last_event_id: Optional[str]):
+        if not last_event_id:
+            return [], True
+        stream_id, _, seq = last_event_id.partition("-")
+        if stream_id != self.stream_id or not seq.isdigit():
+            return [], False
+        seq = int(seq)
+        backlog: List[Event] = [e for e in self._history if e.seq > seq]
+        oldest = self._history[0].seq if self._history else seq + 1
+        return backlog, oldest <= seq + 1
+
+
+bus = EventBus()
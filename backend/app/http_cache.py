@@ -0,0 +1,35 @@
+# app/http_cache.py
+"""ETag helpers for read endpoints validated by the version counters in crud."""
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from . import crud
+
+
+def format_etag(versions: Dict[str, int]) -> str:
+    return '"' + ".".join(f"{name}{value}" for name, value in versions.items()) + '"'
+
+
+def version_etag(db: Session, *names: str) -> str:
+    return format_etag(crud.get_versions(db, *names))
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 response when the client's If-None-Match still matches `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if etag in tags or "*" in tags:
+        response = Response(status_code=304)
+        set_etag(response, etag)
+        return response
+    return None
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    # cacheable, but always revalidated against the ETag
+    response.headers["Cache-Control"] = "no-cache"
@@ -0,0 +1,138 @@
+# app/images.py
+"""
+Product image ingestion.
+
+Uploads are streamed to disk in chunks off the event loop and stored under the
+SHA-256 of their content, so the same image uploaded twice is kept once.
+Thumbnails and WebP variants (served by static.ImageStaticFiles to clients
+that accept them) are rendered in a process pool when Pillow is installed.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from PIL import Image, features
+except ImportError:  # thumbnails and variants are optional
+    Image = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+IMAGES_DIR = os.path.join(STATIC_DIR, "images")
+THUMBS_DIR = os.path.join(IMAGES_DIR, "thumbs")
+IMAGES_URL = "/static/images"
+
+CHUNK_SIZE = 1024 * 1024
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+THUMBNAIL_SIZE = (int(os.getenv("THUMBNAIL_SIZE", 320)),) * 2
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+VARIANTS_DIRNAME = "variants"
+
+os.makedirs(os.path.join(THUMBS_DIR, VARIANTS_DIRNAME), exist_ok=True)
+os.makedirs(os.path.join(IMAGES_DIR, VARIANTS_DIRNAME), exist_ok=True)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class StoredImage(NamedTuple):
+    url: str
+    thumbnail_url: Optional[str]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _write_chunk(out, hasher, chunk: bytes):
+    hasher.update(chunk)
+    out.write(chunk)
+
+
+def variant_path(path: str, fmt: str = "webp") -> str:
+    """`images/<hash>.png` -> `images/variants/<hash>.webp` (same for thumbs)."""
+    directory, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    return os.path.join(directory, VARIANTS_DIRNAME, f"{stem}.{fmt}")
+
+
+def _save(img, dst: str, fmt: str):
+    tmp = f"{dst}.{os.getpid()}.part"
+    img.save(tmp, format=fmt)
+    os.replace(tmp, dst)
+
+
+def _render_derivatives(src: str, thumb: str, size, webp: bool):
+    """Runs in a worker process: thumbnail plus optional WebP variants of both."""
+    fmt = Image.registered_extensions()[os.path.splitext(thumb)[1]]
+    with Image.open(src) as img:
+        # JPEG can't hold alpha, so CMYK/palette sources become RGB there
+        if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA")
+        if webp:
+            _save(img, variant_path(src), "WEBP")
+        img.thumbnail(size)
+        _save(img, thumb, fmt)
+        if webp:
+            _save(img, variant_path(thumb), "WEBP")
+
+
+async def _derivatives(path: str, name: str) -> Optional[str]:
+    """Render the thumbnail (and variants) for a stored image; returns the thumbnail URL."""
+    if Image is None:
+        return None
+    dst = os.path.join(THUMBS_DIR, name)
+    if not os.path.exists(dst):
+        webp = features.check("webp") and not name.endswith(".webp")
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                _get_pool(), _render_derivatives, path, dst, THUMBNAIL_SIZE, webp
+            )
+        except Exception as e:
+            print("Image derivative generation failed:", e)
+            return None
+    return f"{IMAGES_URL}/thumbs/{name}"
+
+
+async def store_upload(upload: UploadFile) -> StoredImage:
+    ext = os.path.splitext(upload.filename or "")[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported image type")
+
+    hasher = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=IMAGES_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await upload.read(CHUNK_SIZE):
+                await run_in_threadpool(_write_chunk, out, hasher, chunk)
+        name = f"{hasher.hexdigest()}{ext}"
+        path = os.path.join(IMAGES_DIR, name)
+        if os.path.exists(path):
+            os.remove(tmp_path)  # already stored
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return StoredImage(f"{IMAGES_URL}/{name}", await _derivatives(path, name))
@@ -1,12 +1,14 @@
 # main.py
+import asyncio
 import os
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from .database import Base, engine
+from .database import engine
 from .crud import get_password_hash
-from . import models
+from . import columnar, models, maintenance, images
+from .migrations import run_migrations
+from .static import ImageStaticFiles
 from .routers import users, products, orders, stats
 
 load_dotenv()
@@ -22,10 +24,10 @@ STATIC_DIR = os.path.join(BASE_DIR, "..", "static")
 os.makedirs(os.path.join(STATIC_DIR, "images"), exist_ok=True)
 
 
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+app.mount("/static", ImageStaticFiles(directory=STATIC_DIR), name="static")
 
 
-Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 
 @app.on_event("startup")
@@ -47,6 +49,37 @@ def seed_admin():
         db.close()
 
 
+@app.on_event("startup")
+def load_stats_store():
+    if stats.STATS_BACKEND != "columnar":
+        return
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        columnar.store.load(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+async def start_maintenance():
+    # load revocations before serving, then keep them in sync in the background
+    await asyncio.to_thread(maintenance.sync_revoked_tokens)
+    app.state.maintenance_task = asyncio.create_task(maintenance.maintenance_loop())
+    app.state.revocation_task = asyncio.create_task(
+        maintenance.revoked_token_sync_loop()
+    )
+
+
+@app.on_event("shutdown")
+async def stop_maintenance():
+    app.state.maintenance_task.cancel()
+    app.state.revocation_task.cancel()
+    images.shutdown()
+    columnar.store.save()
+
+
 app.include_router(users.router, tags=["users"])
 app.include_router(products.router, prefix="/products", tags=["products"])
 app.include_router(orders.router, prefix="/orders", tags=["orders"])
@@ -63,4 +96,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
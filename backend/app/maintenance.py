@@ -0,0 +1,52 @@
+# app/maintenance.py
+"""Periodic housekeeping run in the background while the API is up."""
+import asyncio
+import os
+
+from . import auth, columnar, crud
+from .database import SessionLocal
+
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", 3600))
+
+
+def run_maintenance():
+    db = SessionLocal()
+    try:
+        removed = crud.purge_expired_idempotency_keys(db)
+        if removed:
+            print(f"Purged {removed} expired idempotency keys.")
+        removed = auth.purge_expired_revoked_tokens(db)
+        if removed:
+            print(f"Purged {removed} expired token revocations.")
+        if columnar.store.enabled:
+            columnar.store.sync(db)
+            columnar.store.save()
+    finally:
+        db.close()
+
+
+async def maintenance_loop():
+    while True:
+        try:
+            await asyncio.to_thread(run_maintenance)
+        except Exception as e:
+            print("Maintenance run failed:", e)
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+
+def sync_revoked_tokens():
+    db = SessionLocal()
+    try:
+        auth.revoked_tokens.sync(db)
+    finally:
+        db.close()
+
+
+async def revoked_token_sync_loop():
+    """Pick up tokens revoked by other workers (see auth.RevokedTokenSet)."""
+    while True:
+        await asyncio.sleep(auth.REVOKED_TOKEN_SYNC_SECONDS)
+        try:
+            await asyncio.to_thread(sync_revoked_tokens)
+        except Exception as e:
+            print("Revoked token sync failed:", e)
@@ -0,0 +1,143 @@
+# app/migrations.py
+"""
+Lightweight in-place migrations.
+
+`Base.metadata.create_all` only creates missing tables. Changes to existing
+tables and data backfills are listed in `MIGRATIONS` and applied once, in
+order, at startup; applied names are recorded in `schema_migrations`.
+"""
+from sqlalchemy import func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from . import models, rollups
+from .aggregation import order_totals_query
+from .database import Base
+
+
+def _backfill_order_headers(conn: Connection):
+    """Create an order header for every code that only exists as order lines."""
+    order = models.Order.__table__
+    header = models.OrderHeader.__table__
+
+    missing = order_totals_query(order).where(
+        order.c.code.not_in(select(header.c.code))
+    )
+    conn.execute(
+        insert(header).from_select(
+            ["code", "user_id", "total", "item_count", "collected", "created_at"],
+            missing,
+        )
+    )
+
+
+def _normalize_order_codes(conn: Connection):
+    """Store every order code in its canonical upper-case form."""
+    for table in (models.Order.__table__, models.OrderHeader.__table__):
+        canonical = func.upper(func.trim(table.c.code))
+        conn.execute(
+            update(table).where(table.c.code != canonical).values(code=canonical)
+        )
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _add_order_header_archived(conn: Connection):
+    _add_column(conn, "order_headers", "archived", "BOOLEAN NOT NULL DEFAULT 0")
+
+
+def _add_product_thumbnail_url(conn: Connection):
+    _add_column(conn, "products", "thumbnail_url", "VARCHAR(255)")
+
+
+def _create_products_fts(conn: Connection):
+    """FTS5 index over product name/description, kept in sync by triggers."""
+    if conn.dialect.name != "sqlite":
+        return
+    for statement in (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+        "name, description, content='products', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+        "INSERT INTO products_fts(rowid, name, description) "
+        "VALUES (new.id, new.name, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+        "INSERT INTO products_fts(products_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS products_fts_au "
+        "AFTER UPDATE OF name, description ON products BEGIN "
+        "INSERT INTO products_fts(products_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); "
+        "INSERT INTO products_fts(rowid, name, description) "
+        "VALUES (new.id, new.name, new.description); END",
+        "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+    ):
+        conn.execute(text(statement))
+
+
+def _backfill_sales_rollups(conn: Connection):
+    rollups.rebuild(conn)
+
+
+def _add_order_header_collected_seq(conn: Connection):
+    _add_column(conn, "order_headers", "collected_seq", "INTEGER")
+
+
+def _add_revoked_token_expires_at(conn: Connection):
+    _add_column(conn, "revoked_tokens", "expires_at", "DATETIME")
+
+
+def _add_idempotency_request_hash(conn: Connection):
+    _add_column(conn, "idempotency_keys", "request_hash", "VARCHAR(64)")
+
+
+def _create_missing_indexes(conn: Connection):
+    """Indexes declared on models but missing from tables created earlier."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    ("0001_backfill_order_headers", _backfill_order_headers),
+    ("0002_normalize_order_codes", _normalize_order_codes),
+    ("0003_order_header_archived", _add_order_header_archived),
+    ("0004_products_fts", _create_products_fts),
+    ("0005_product_thumbnail_url", _add_product_thumbnail_url),
+    ("0006_sales_rollups", _backfill_sales_rollups),
+    ("0007_order_header_collected_seq", _add_order_header_collected_seq),
+    ("0008_revoked_token_expires_at", _add_revoked_token_expires_at),
+    ("0009_idempotency_request_hash", _add_idempotency_request_hash),
+]
+
+
+def run_migrations(engine: Engine):
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "name VARCHAR PRIMARY KEY, "
+                "applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+            )
+        )
+        applied = set(conn.execute(text("SELECT name FROM schema_migrations")).scalars())
+
+    for name, migrate in MIGRATIONS:
+        if name in applied:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (name) VALUES (:name)"),
+                {"name": name},
+            )
+        print(f"Applied migration {name}.")
+
+    # after the migrations, so indexes on newly added columns can be created
+    with engine.begin() as conn:
+        _create_missing_indexes(conn)
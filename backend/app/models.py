@@ -7,6 +7,8 @@ from sqlalchemy import (
     Boolean,
     ForeignKey,
     DateTime,
+    Index,
+    UniqueConstraint,
     func,
 )
 from sqlalchemy.orm import relationship
@@ -36,6 +38,7 @@ class Product(Base):
     quantity = Column(Integer, nullable=False, default=0)
     description = Column(Text, nullable=True)
     image_url = Column(String(255), nullable=True)
+    thumbnail_url = Column(String(255), nullable=True)
 
     orders = relationship("Order", back_populates="product")
 
@@ -60,11 +63,114 @@ class Order(Base):
     product = relationship("Product", back_populates="orders")
     user = relationship("User", back_populates="orders")
 
+    __table_args__ = (
+        Index("ix_orders_user_id_code", "user_id", "code"),
+        # stats / time series: collected lines in a created_at range
+        Index("ix_orders_collected_created_at", "collected", "created_at"),
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        # "does this product have orders" check in crud.delete_product
+        Index("ix_orders_product_id", "product_id"),
+    )
+
+
+class ArchivedOrder(Base):
+    """Order lines of old collected orders, moved out of the live `orders` table."""
+
+    __tablename__ = "archived_orders"
+
+    id = Column(Integer, primary_key=True)  # same id as the original orders row
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    quantity = Column(Integer, nullable=False)
+    code = Column(String, index=True, nullable=False)
+    collected = Column(Boolean, default=True, nullable=False)
+    total_amount = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), index=True)
+    unit_price = Column(Float, nullable=False, default=0.0)
+    line_total = Column(Float, nullable=False, default=0.0)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_archived_orders_product_id", "product_id"),)
+
+
+class OrderHeader(Base):
+    """One row per order code with the totals precomputed at checkout."""
+
+    __tablename__ = "order_headers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    total = Column(Float, nullable=False, default=0.0)  # sum of line totals
+    item_count = Column(Integer, nullable=False, default=0)  # number of order lines
+    collected = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    archived = Column(Boolean, default=False, nullable=False)  # lines in archived_orders
+    # "collect_seq" counter value of the collect that flipped `collected` (see columnar.py)
+    collected_seq = Column(Integer, nullable=True, index=True)
+
+    user = relationship("User")
+
+    __table_args__ = (
+        # admin listing (newest first, optionally by state) and "my orders"
+        Index("ix_order_headers_created_at_code", "created_at", "code"),
+        Index("ix_order_headers_collected_created_at", "collected", "created_at", "code"),
+        Index("ix_order_headers_user_id_created_at", "user_id", "created_at"),
+    )
+
+
+class Counter(Base):
+    """Named monotonically increasing counters (e.g. the order code sequence)."""
+
+    __tablename__ = "counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class DailySales(Base):
+    """Collected orders per day (by order creation date), kept by app/rollups.py."""
+
+    __tablename__ = "daily_sales"
+
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+class DailyProductSales(Base):
+    """Collected order lines per day and product, kept by app/rollups.py."""
+
+    __tablename__ = "daily_product_sales"
+
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD
+    product_id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+    order_count = Column(Integer, nullable=False, default=0)  # distinct orders
+
+
+class IdempotencyKey(Base):
+    """Stored response for a client-supplied Idempotency-Key (per user)."""
+
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String(255), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    response = Column(Text, nullable=False)  # JSON body of the original response
+    request_hash = Column(String(64), nullable=True)  # sha256 of the original request body
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),)
+
 
 class RevokedToken(Base):
     __tablename__ = "revoked_tokens"
 
     id = Column(Integer, primary_key=True, index=True)
     jti = Column(String, unique=True, index=True, nullable=False)
-    revoked_at = Column(DateTime, default=datetime.utcnow)
+    revoked_at = Column(DateTime, default=datetime.utcnow, index=True)
     reason = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)  # the token's exp
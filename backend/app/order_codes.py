@@ -0,0 +1,64 @@
+# app/order_codes.py
+"""
+Order code allocation.
+
+Codes are derived from a monotonically increasing counter through a keyed
+permutation of the 6-character code space, so consecutive orders get
+unrelated-looking codes and no two counter values map to the same code.
+The key comes from ORDER_CODE_KEY, or else a random key created on first use
+and kept in the counters table (see crud.order_code_key), so codes can't be
+enumerated from the source. Changing it on a live database only risks
+collisions with existing codes, which the unique header constraint catches.
+"""
+import hashlib
+import string
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH  # 2,176,782,336 codes
+
+_HALF_BITS = 16
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+
+def _round(value: int, round_no: int, key: bytes) -> int:
+    digest = hashlib.blake2b(
+        value.to_bytes(2, "big") + bytes([round_no]), key=key, digest_size=2
+    ).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _feistel(value: int, key: bytes) -> int:
+    """Keyed bijection on 32-bit integers."""
+    left, right = value >> _HALF_BITS, value & _HALF_MASK
+    for round_no in range(_ROUNDS):
+        left, right = right, left ^ _round(right, round_no, key)
+    return (left << _HALF_BITS) | right
+
+
+def permute(value: int, key: bytes) -> int:
+    """Keyed bijection on [0, CODE_SPACE), by cycle-walking the 32-bit Feistel."""
+    value %= CODE_SPACE
+    while True:
+        value = _feistel(value, key)
+        if value < CODE_SPACE:
+            return value
+
+
+def encode(value: int) -> str:
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, index = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return "".join(reversed(chars))
+
+
+def normalize(code: str) -> str:
+    """Canonical stored form of a user-supplied code."""
+    return code.strip().upper()
+
+
+def code_for(sequence_value: int, key: bytes) -> str:
+    """The order code for the n-th allocation under `key`."""
+    return encode(permute(sequence_value, key))
@@ -0,0 +1,120 @@
+# app/rollups.py
+"""
+Daily sales rollups behind GET /stats.
+
+`daily_sales` and `daily_product_sales` hold collected orders aggregated per
+day of `created_at` (and per product). `apply_collected` adds orders to them
+in the same transaction that marks them collected, so stats read a few rows
+per day instead of scanning order lines. Rebuild from the order tables with:
+
+    python -m app.rollups --since 2024-01-01
+"""
+import argparse
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select, union_all
+from sqlalchemy.dialects.sqlite import insert
+
+from . import models
+
+_LINE_COLUMNS = ("code", "product_id", "quantity", "collected", "created_at", "line_total")
+
+
+def _day_totals(lines):
+    day = func.date(lines.c.created_at)
+    per_day = select(
+        day.label("day"),
+        func.count(func.distinct(lines.c.code)).label("order_count"),
+        func.sum(lines.c.line_total).label("revenue"),
+    ).group_by(day)
+    per_product = select(
+        day.label("day"),
+        lines.c.product_id,
+        func.sum(lines.c.quantity).label("quantity"),
+        func.sum(lines.c.line_total).label("revenue"),
+        func.count(func.distinct(lines.c.code)).label("order_count"),
+    ).group_by(day, lines.c.product_id)
+    return per_day, per_product
+
+
+def apply_collected(db, codes: List[str]) -> List[str]:
+    """
+    Add orders that just went from pending to collected to the rollups (no
+    commit). Returns the days that changed.
+    """
+    if not codes:
+        return []
+    order = models.Order.__table__
+    per_day, per_product = _day_totals(order)
+    per_day = per_day.where(order.c.code.in_(codes))
+    per_product = per_product.where(order.c.code.in_(codes))
+
+    days: List[str] = []
+    for table, query, keys in (
+        (models.DailySales.__table__, per_day, ["day"]),
+        (models.DailyProductSales.__table__, per_product, ["day", "product_id"]),
+    ):
+        rows = [row._asdict() for row in db.execute(query)]
+        if not rows:
+            continue
+        if not days:
+            days = [row["day"] for row in rows]
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={
+                name: table.c[name] + stmt.excluded[name]
+                for name in rows[0]
+                if name not in keys
+            },
+        )
+        db.execute(stmt, rows)
+    return days
+
+
+def rebuild(db, since: Optional[str] = None):
+    """Recompute the rollups (from day `since`, YYYY-MM-DD, onwards) from order lines."""
+    order = models.Order.__table__
+    archived = models.ArchivedOrder.__table__
+    lines = union_all(
+        select(*(order.c[name] for name in _LINE_COLUMNS)),
+        select(*(archived.c[name] for name in _LINE_COLUMNS)),
+    ).subquery("order_lines")
+    per_day, per_product = _day_totals(lines)
+    per_day = per_day.where(lines.c.collected.is_(True))
+    per_product = per_product.where(lines.c.collected.is_(True))
+    if since is not None:
+        per_day = per_day.where(func.date(lines.c.created_at) >= since)
+        per_product = per_product.where(func.date(lines.c.created_at) >= since)
+
+    for table, query in (
+        (models.DailySales.__table__, per_day),
+        (models.DailyProductSales.__table__, per_product),
+    ):
+        stale = delete(table)
+        if since is not None:
+            stale = stale.where(table.c.day >= since)
+        db.execute(stale)
+        db.execute(insert(table).from_select(list(query.selected_columns.keys()), query))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the daily sales rollups.")
+    parser.add_argument("--since", default=None, help="only rebuild days >= YYYY-MM-DD")
+    args = parser.parse_args()
+
+    from .database import SessionLocal, engine
+    from .migrations import run_migrations
+
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        rebuild(db, since=args.since)
+        db.commit()
+    finally:
+        db.close()
+    print("Rollups rebuilt" + (f" from {args.since}." if args.since else "."))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,39 @@
 # routers/orders.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from .. import crud, schemas, auth, models
-from ..database import get_db
+from typing import List, Optional
+from datetime import datetime
+from .. import crud, schemas, auth, models, http_cache
+from ..cache import order_cache
+from ..events import SSE_KEEPALIVE_SECONDS, SSE_RETRY_MS, bus
+from ..database import SessionLocal, get_db
 from sqlalchemy import func
 
 router = APIRouter()
 
 
+def _parse_date_range(start_date: Optional[str], end_date: Optional[str]):
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="Invalid date format. Use YYYY-MM-DD."
+        )
+    return start, end
+
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
 from fastapi import Body
 
 
@@ -17,16 +42,66 @@ from fastapi import Body
     response_model=schemas.OrderResponse,
 )
 def create_orders_endpoint(
+    response: Response,
     orders: List[schemas.OrderCreate] = Body(...),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user),  # ✅ get actual user
+    idempotency_key: Optional[str] = Header(None, max_length=255),
 ):
-    return crud.create_orders(db, orders, user_id=current_user.id)  # ✅ pass user_id
+    """
+    Place an order. Clients may send an `Idempotency-Key` header; retries with
+    the same key return the original order instead of placing a new one, and
+    reusing a key with a different cart is rejected with 422.
+    """
+    if idempotency_key:
+        stored = crud.get_idempotent_response(
+            db, current_user.id, idempotency_key, crud.order_request_hash(orders)
+        )
+        if stored is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return stored
+
+    return crud.create_orders(
+        db, orders, user_id=current_user.id, idempotency_key=idempotency_key
+    )  # ✅ pass user_id
 
 
 @router.get("/", response_model=List[schemas.OrderResponse])
-def read_orders(db: Session = Depends(get_db)):
-    return crud.get_all_orders(db)
+def read_orders(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    collected: Optional[bool] = Query(None),
+    user_id: Optional[int] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+):
+    """
+    Newest orders first, one page at a time. When more orders exist the
+    `X-Next-Cursor` response header carries the cursor for the next page.
+    """
+    etag = http_cache.version_etag(db, "orders")
+    cached = http_cache.not_modified(request, etag)
+    if cached:
+        return cached
+
+    start, end = _parse_date_range(start_date, end_date)
+
+    orders, next_cursor = crud.get_orders_page(
+        db,
+        limit=limit,
+        cursor=cursor,
+        collected=collected,
+        user_id=user_id,
+        start=start,
+        end=end,
+    )
+    http_cache.set_etag(response, etag)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return orders
 
 
 @router.get("/my")
@@ -49,9 +124,154 @@ def get_my_order_by_code(
     return result
 
 
+@router.post(
+    "/collect",
+    response_model=schemas.BulkCollectResponse,
+    dependencies=[Depends(auth.get_current_admin)],
+)
+def bulk_mark_orders_collected(
+    payload: schemas.OrderCodeList = Body(...), db: Session = Depends(get_db)
+):
+    """Mark many order codes collected at once (e.g. a batch of scanned receipts)."""
+    updated, not_found = crud.mark_orders_collected(db, payload.codes)
+    return {"updated": updated, "not_found": not_found}
+
+
+@router.post("/events/token")
+def create_events_token(current_admin: models.User = Depends(auth.get_current_admin)):
+    """Short-lived token for `GET /orders/events?token=...` (EventSource can't send headers)."""
+    return {
+        "token": auth.create_events_token({"sub": current_admin.username}),
+        "expires_in": auth.EVENTS_TOKEN_EXPIRE_SECONDS,
+    }
+
+
+def _orders_version() -> int:
+    db = SessionLocal()
+    try:
+        return crud.get_versions(db, "orders")["orders"]
+    finally:
+        db.close()
+
+
+@router.get("/events", dependencies=[Depends(auth.get_events_admin)])
+async def order_events(
+    request: Request,
+    db: Session = Depends(get_db),
+    last_event_id: Optional[str] = Header(None),
+    since: Optional[str] = Query(None, description="Resume after this event id"),
+):
+    """
+    Server-Sent Events feed of `order.created` and `order.collected` events.
+    Browsers authenticate with `?token=` from POST /orders/events/token, which
+    is only checked on connect. Reconnecting clients resume from
+    `Last-Event-ID` (or `since`); a `resync` event means events were missed and
+    the client should refetch.
+
+    The bus only carries this worker's writes, so each keep-alive tick also
+    checks `version:orders` and sends `resync` when it moved (which may repeat
+    a change that was already delivered as an event).
+    """
+    # don't hold a pooled connection for the lifetime of the stream
+    db.close()
+
+    async def stream():
+        sub, backlog, complete = bus.subscribe(last_event_id or since)
+        try:
+            version = await asyncio.to_thread(_orders_version)
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            if not complete:
+                yield "event: resync\ndata: {}\n\n"
+            for event in backlog:
+                yield event.encode()
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        sub.get(), timeout=SSE_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    latest = await asyncio.to_thread(_orders_version)
+                    if latest != version:
+                        # changed by another worker (or by events already sent)
+                        version = latest
+                        yield "event: resync\ndata: {}\n\n"
+                    else:
+                        yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # too slow to keep up; make the client reconnect and refetch
+                    yield "event: resync\ndata: {}\n\n"
+                    break
+                yield event.encode()
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/export", dependencies=[Depends(auth.get_current_admin)])
+def export_orders(
+    db: Session = Depends(get_db),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    collected: Optional[bool] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+):
+    """Stream every order line as NDJSON or CSV, e.g. for accounting."""
+    start, end = _parse_date_range(start_date, end_date)
+    # the stream uses its own session; release the request's connection now
+    db.close()
+
+    def rows():
+        export_db = SessionLocal()
+        try:
+            if format == "csv":
+                yield _csv_chunk([crud.EXPORT_COLUMNS])
+            for batch in crud.iter_order_export(
+                export_db, start=start, end=end, collected=collected
+            ):
+                if format == "csv":
+                    yield _csv_chunk(batch)
+                else:
+                    yield "".join(
+                        json.dumps(dict(zip(crud.EXPORT_COLUMNS, row)), default=str)
+                        + "\n"
+                        for row in batch
+                    )
+        finally:
+            export_db.close()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"orders.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/cache/stats", dependencies=[Depends(auth.get_current_admin)])
+def order_cache_stats():
+    """Hit/miss counters of the in-process order-by-code cache."""
+    return order_cache.stats()
+
+
 @router.get("/{code}", response_model=schemas.OrderResponse)
-def read_order_by_code(code: str, db: Session = Depends(get_db)):
-    return crud.get_order_by_code(db, code)
+def read_order_by_code(
+    code: str, request: Request, response: Response, db: Session = Depends(get_db)
+):
+    # the body is built for exactly the version named by the ETag
+    version = crud.get_versions(db, "orders")["orders"]
+    etag = http_cache.format_etag({"orders": version})
+    cached = http_cache.not_modified(request, etag)
+    if cached:
+        return cached
+    http_cache.set_etag(response, etag)
+    return crud.get_order_by_code(db, code, version)
 
 
 @router.patch("/{code}", dependencies=[Depends(auth.get_current_admin)])
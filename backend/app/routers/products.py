@@ -1,23 +1,109 @@
 # routers/products.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+import csv
+import io
+import json
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    UploadFile,
+    File,
+    Form,
+    Query,
+    Request,
+    Response,
+)
 from sqlalchemy.orm import Session
-import shutil, os
-from .. import crud, schemas, auth
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from .. import crud, schemas, auth, http_cache, images
+from ..catalog import catalog
 from ..database import get_db
 from fastapi import Body
 
 
 router = APIRouter(tags=["Products"])
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-STATIC_DIR = os.path.join(os.path.dirname(BASE_DIR), "static")
-IMAGES_DIR = os.path.join(STATIC_DIR, "images")
-os.makedirs(IMAGES_DIR, exist_ok=True)
+
+def _parse_bulk_rows(content_type: str, body: bytes) -> list:
+    try:
+        if "csv" in content_type:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            # blank cells mean "leave unchanged", like missing JSON keys
+            return [
+                {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()}
+                for row in reader
+            ]
+        rows = json.loads(body)
+    except (UnicodeDecodeError, ValueError, csv.Error):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+    return rows
 
 
 @router.get("/", response_model=list[schemas.ProductResponse])
-def list_products(db: Session = Depends(get_db)):
-    return crud.get_all_products(db)
+def list_products(request: Request, db: Session = Depends(get_db)):
+    # served from the pre-serialized snapshot; rebuilt only when products change
+    version, body = catalog.get(db)
+    etag = http_cache.format_etag({"products": version})
+    cached = http_cache.not_modified(request, etag)
+    if cached:
+        return cached
+    response = Response(content=body, media_type="application/json")
+    http_cache.set_etag(response, etag)
+    return response
+
+
+@router.get("/search", response_model=list[schemas.ProductResponse])
+def search_products(
+    response: Response,
+    db: Session = Depends(get_db),
+    q: Optional[str] = Query(None, description="Words to match in name/description"),
+    limit: int = Query(24, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = Query(False),
+):
+    """
+    Server-side product search, best matches first (or by id without `q`).
+    When more results exist the `X-Next-Cursor` header carries the next page cursor.
+    """
+    products, next_cursor = crud.search_products(
+        db,
+        q=q,
+        limit=limit,
+        cursor=cursor,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return products
+
+
+@router.post(
+    "/bulk",
+    response_model=schemas.BulkProductResult,
+    dependencies=[Depends(auth.get_current_admin)],
+)
+async def bulk_upsert_products(request: Request, db: Session = Depends(get_db)):
+    """
+    Create/update many products from a JSON array or a CSV body
+    (`Content-Type: text/csv`, header row of ProductUpsert field names).
+    Valid rows are applied; invalid ones come back in `errors` by row number.
+    Requires admin.
+    """
+    rows = _parse_bulk_rows(request.headers.get("content-type", ""), await request.body())
+    if len(rows) > crud.BULK_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {crud.BULK_IMPORT_MAX_ROWS} rows per request",
+        )
+    return await run_in_threadpool(crud.bulk_upsert_products, db, rows)
 
 
 @router.get("/{product_id}", response_model=schemas.ProductResponse)
@@ -41,13 +127,10 @@ async def create_product(
     image: UploadFile = File(None),
     db: Session = Depends(get_db),
 ):
-    image_url = None
+    image_url = thumbnail_url = None
     if image:
-        # Save to the same static/images directory used in main.py
-        file_path = os.path.join(IMAGES_DIR, image.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-        image_url = f"/static/images/{image.filename}"
+        # streamed to static/images under its content hash (see images.py)
+        image_url, thumbnail_url = await images.store_upload(image)
 
     product_data = {
         "name": name,
@@ -55,9 +138,11 @@ async def create_product(
         "quantity": int(quantity),
         "description": description,
         "image_url": image_url,
+        "thumbnail_url": thumbnail_url,
     }
 
-    product = crud.create_product(db, product_data)
+    # keep the blocking DB work off the event loop
+    product = await run_in_threadpool(crud.create_product, db, product_data)
     return product
 
 
@@ -86,24 +171,21 @@ def update_product_endpoint(
     response_model=schemas.ProductResponse,
     dependencies=[Depends(auth.get_current_admin)],
 )
-def update_product_image(
+async def update_product_image(
     product_id: int,
     image: UploadFile = File(...),
     db: Session = Depends(get_db),
 ):
-    # implement file save logic (e.g. write to /static/uploads/ and set product.image_url)
-    product = crud.get_product(db, product_id)
+    product = await run_in_threadpool(crud.get_product, db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # example saving - adjust path and URL composition to your app
-    filename = f"/uploads/{product_id}-{image.filename}"
-    with open(f"./static{filename}", "wb") as f:
-        f.write(image.file.read())
-
-    product.image_url = filename
-    db.commit()
-    db.refresh(product)
+    image_url, thumbnail_url = await images.store_upload(image)
+    product = await run_in_threadpool(
+        crud.set_product_image, db, product_id, image_url, thumbnail_url
+    )
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
     return product
 
 
@@ -1,98 +1,197 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
-from .. import crud, schemas, auth, models
+from typing import Dict, List, Literal
+from .. import crud, schemas, auth, models, columnar
+from ..cache import STATS_CACHE_MOVING_TTL, stats_cache
 from ..database import get_db
 from sqlalchemy import func
-from sqlalchemy import and_
-from datetime import datetime, timedelta
+from sqlalchemy import Integer, String, cast, select, type_coerce, union_all
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import os
+import threading
+import time
 
 router = APIRouter()
 
+STATS_BACKEND = os.getenv("STATS_BACKEND", "rollup")  # "rollup", "raw" or "columnar"
+
+_LINE_COLUMNS = ("code", "product_id", "quantity", "collected", "created_at", "line_total")
 
-@router.get("/", dependencies=[Depends(auth.get_current_admin)])
-def get_order_stats(
-    db: Session = Depends(get_db),
-    range: str = Query(None, description="Options: day, week, month, year, or custom"),
-    start_date: str = Query(None),
-    end_date: str = Query(None),
-):
-    """
-    Returns statistics. Important: total_orders counts unique order codes (not item rows).
-    Date filters apply to the Order.created_at column.
 
-    This implementation prefers `Order.line_total` (snapshot) when present and falls
-    back to `Order.total_amount` for backward compatibility.
+def _order_lines_source(db: Session, start, end):
     """
+    The live `orders` table, or its union with `archived_orders` when archived
+    lines may fall inside [start, end].
+    """
+    order = models.Order.__table__
+    archived = models.ArchivedOrder.__table__
+
+    in_range = db.query(archived.c.id)
+    if start is not None:
+        in_range = in_range.filter(archived.c.created_at >= start)
+    if end is not None:
+        in_range = in_range.filter(archived.c.created_at <= end)
+    if in_range.first() is None:
+        return order
+
+    return union_all(
+        select(*(order.c[name] for name in _LINE_COLUMNS)),
+        select(*(archived.c[name] for name in _LINE_COLUMNS)),
+    ).subquery("order_lines")
 
-    # Base query: collected orders only
-    query = db.query(models.Order).filter(models.Order.collected == True)
 
+def _resolve_range(range: str, start_date: str, end_date: str):
     now = datetime.utcnow()
+    start = end = None
 
-    # Apply date range filters to `query`
+    # Resolve the date range applied to created_at
     if range == "day":
         start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        query = query.filter(models.Order.created_at >= start)
     elif range == "week":
         start = now - timedelta(days=7)
-        query = query.filter(models.Order.created_at >= start)
     elif range == "month":
         start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        query = query.filter(models.Order.created_at >= start)
     elif range == "year":
         start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        query = query.filter(models.Order.created_at >= start)
     elif range == "custom" and start_date and end_date:
         try:
             start = datetime.fromisoformat(start_date)
             end = datetime.fromisoformat(end_date)
-            query = query.filter(
-                and_(models.Order.created_at >= start, models.Order.created_at <= end)
-            )
         except ValueError:
             raise HTTPException(
                 status_code=400, detail="Invalid date format. Use YYYY-MM-DD."
             )
+    return start, end
 
-    # Choose revenue field: prefer line_total (snapshot) if present, otherwise use total_amount
-    revenue_field = getattr(models.Order, "line_total", None) or getattr(
-        models.Order, "total_amount"
-    )
 
-    # --- total_orders: count distinct codes (unique orders) ---
-    total_orders = (
-        query.with_entities(func.count(func.distinct(models.Order.code))).scalar() or 0
-    )
+def _rollup_stats(db: Session, start, end):
+    """Stats from the daily rollups (see app/rollups.py); whole days only."""
+    daily = models.DailySales.__table__
+    per_product = models.DailyProductSales.__table__
+    product = models.Product.__table__
 
-    # --- total_revenue: sum of chosen revenue field across filtered rows ---
-    total_revenue = query.with_entities(func.sum(revenue_field)).scalar() or 0
+    def in_range(table, query):
+        if start is not None:
+            query = query.where(table.c.day >= start.date().isoformat())
+        if end is not None:
+            query = query.where(table.c.day <= end.date().isoformat())
+        return query
 
-    # --- monthly_stats: revenue per month (formatted YYYY-MM) using chosen revenue field ---
-    monthly_stats = (
-        query.with_entities(
-            func.strftime("%Y-%m", models.Order.created_at).label("month"),
-            func.sum(revenue_field).label("revenue"),
-        )
-        .group_by("month")
-        .order_by("month")
-        .all()
-    )
+    total_orders, total_revenue = db.execute(
+        in_range(daily, select(func.sum(daily.c.order_count), func.sum(daily.c.revenue)))
+    ).one()
+
+    month = func.substr(daily.c.day, 1, 7).label("month")
+    monthly_stats = db.execute(
+        in_range(daily, select(month, func.sum(daily.c.revenue)))
+        .group_by(month)
+        .order_by(month)
+    ).all()
 
-    # --- top_products: aggregate by product using quantity and chosen revenue field ---
-    top_products = (
-        query.join(models.Product, models.Product.id == models.Order.product_id)
-        .with_entities(
-            models.Product.name,
-            func.sum(models.Order.quantity).label("total_sold"),
-            func.sum(revenue_field).label("revenue"),
+    total_sold = func.sum(per_product.c.quantity)
+    top_products = db.execute(
+        in_range(
+            per_product,
+            select(
+                func.coalesce(product.c.name, "Unknown"),
+                total_sold,
+                func.sum(per_product.c.revenue),
+            ).select_from(
+                per_product.outerjoin(product, product.c.id == per_product.c.product_id)
+            ),
         )
-        .group_by(models.Product.name)
-        .order_by(func.sum(models.Order.quantity).desc())
+        .group_by(per_product.c.product_id)
+        .order_by(total_sold.desc())
         .limit(5)
-        .all()
+    ).all()
+    return total_orders or 0, total_revenue or 0, monthly_stats, top_products
+
+
+def _raw_stats(db: Session, start, end):
+    """
+    Stats straight from the order lines (live plus archived when in range).
+
+    Revenue, monthly buckets and top products all come from one GROUP BY
+    (month, product) scan folded here; distinct order codes need their own
+    count because they don't add up across products.
+    """
+    lines = _order_lines_source(db, start, end)
+
+    conditions = [lines.c.collected.is_(True)]
+    if start is not None:
+        conditions.append(lines.c.created_at >= start)
+    if end is not None:
+        conditions.append(lines.c.created_at <= end)
+
+    total_orders = db.execute(
+        select(func.count(func.distinct(lines.c.code))).where(*conditions)
+    ).scalar()
+
+    month = func.strftime("%Y-%m", lines.c.created_at).label("month")
+    buckets = db.execute(
+        select(
+            month,
+            lines.c.product_id,
+            func.sum(lines.c.quantity),
+            func.sum(lines.c.line_total),
+        )
+        .where(*conditions)
+        .group_by(month, lines.c.product_id)
+    )
+
+    total_revenue = 0.0
+    monthly: Dict[str, float] = {}
+    products: Dict[int, List[float]] = {}
+    for month, product_id, quantity, revenue in buckets:
+        revenue = revenue or 0
+        total_revenue += revenue
+        monthly[month] = monthly.get(month, 0) + revenue
+        sold = products.setdefault(product_id, [0, 0.0])
+        sold[0] += quantity or 0
+        sold[1] += revenue
+
+    # top products by id, so different products sharing a name stay apart
+    top = sorted(products.items(), key=lambda item: item[1][0], reverse=True)[:5]
+    top_products = _with_names(
+        db, [(product_id, quantity, revenue) for product_id, (quantity, revenue) in top]
+    )
+    return total_orders or 0, total_revenue, sorted(monthly.items()), top_products
+
+
+def _with_names(db: Session, top):
+    """[(product_id, quantity, revenue)] -> [(name, quantity, revenue)]."""
+    names = dict(
+        db.execute(
+            select(models.Product.id, models.Product.name).where(
+                models.Product.id.in_([product_id for product_id, _, _ in top])
+            )
+        ).all()
     )
+    return [
+        (names.get(product_id, "Unknown"), quantity, revenue)
+        for product_id, quantity, revenue in top
+    ]
+
+
+def _columnar_stats(db: Session, start, end):
+    """Stats from the NumPy column store (see app/columnar.py)."""
+    if not columnar.store.enabled:
+        columnar.store.load(db)
+    else:
+        columnar.store.sync(db)
+    total_orders, total_revenue, monthly_stats, top = columnar.store.stats(start, end)
+    return total_orders, total_revenue, monthly_stats, _with_names(db, top)
+
 
+_BACKENDS = {"rollup": _rollup_stats, "raw": _raw_stats, "columnar": _columnar_stats}
+
+
+def _compute_stats(db: Session, start, end):
+    total_orders, total_revenue, monthly_stats, top_products = _BACKENDS[STATS_BACKEND](
+        db, start, end
+    )
     return {
         "total_orders": int(total_orders),
         "total_revenue": float(total_revenue),
@@ -104,3 +203,284 @@ def get_order_stats(
             for n, s, r in top_products
         ],
     }
+
+
+# cache key -> Future of the computation in flight, so concurrent misses on the
+# same key wait for it while other keys compute in parallel
+_computing: Dict[tuple, Future] = {}
+_computing_lock = threading.Lock()
+_compute_times = {"count": 0, "total_seconds": 0.0, "last_seconds": 0.0}
+
+
+@router.get("/", dependencies=[Depends(auth.get_current_admin)])
+def get_order_stats(
+    db: Session = Depends(get_db),
+    range: str = Query(None, description="Options: day, week, month, year, or custom"),
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+):
+    """
+    Returns statistics. Important: total_orders counts unique order codes (not item rows).
+    Date filters apply to the Order.created_at column.
+
+    Revenue uses the `Order.line_total` snapshot. Archived orders are included.
+    With the default rollup backend ranges cover whole days, the end date
+    included; STATS_BACKEND=raw scans the order lines instead.
+
+    Results are cached per (range, start_date, end_date, version:stats). That
+    counter moves only on collects, archiving and product renames (checkouts
+    don't change stats), so those on any worker move on to a fresh entry.
+    Collects in this process also drop the entries covering their days, and
+    day/week ranges expire after STATS_CACHE_MOVING_TTL.
+    """
+    key = (range, start_date, end_date, crud.get_versions(db, "stats")["stats"])
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached[2]
+
+    start, end = _resolve_range(range, start_date, end_date)
+    # concurrent misses on this key wait for the first computation instead of repeating it
+    with _computing_lock:
+        cached = stats_cache.get(key, count=False)
+        if cached is not None:
+            return cached[2]
+        pending = _computing.get(key)
+        if pending is None:
+            pending = _computing[key] = Future()
+            owner = True
+        else:
+            owner = False
+    if not owner:
+        return pending.result()
+
+    try:
+        generation = stats_cache.generation
+        began = time.perf_counter()
+        payload = _compute_stats(db, start, end)
+        elapsed = time.perf_counter() - began
+        with _computing_lock:
+            _compute_times["count"] += 1
+            _compute_times["total_seconds"] += elapsed
+            _compute_times["last_seconds"] = elapsed
+
+        # skip storing if an order was collected meanwhile; the result may predate it
+        if stats_cache.generation == generation:
+            entry = (
+                start.date().isoformat() if start else None,
+                end.date().isoformat() if end else None,
+                payload,
+            )
+            ttl = STATS_CACHE_MOVING_TTL if range in ("day", "week") else None
+            stats_cache.set(key, entry, ttl=ttl)
+        pending.set_result(payload)
+        return payload
+    except BaseException as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        with _computing_lock:
+            del _computing[key]
+
+
+@router.get("/cache", dependencies=[Depends(auth.get_current_admin)])
+def stats_cache_stats():
+    """Hit ratio of the stats cache and time spent computing stats on misses."""
+    count = _compute_times["count"]
+    return {
+        **stats_cache.stats(),
+        "computations": count,
+        "avg_compute_ms": round(_compute_times["total_seconds"] / count * 1000, 2)
+        if count
+        else 0.0,
+        "last_compute_ms": round(_compute_times["last_seconds"] * 1000, 2),
+    }
+
+
+TIMESERIES_MAX_BUCKETS = int(os.getenv("TIMESERIES_MAX_BUCKETS", 10000))
+
+_BUCKET_LABELS = {"hour": "%Y-%m-%dT%H:00", "day": "%Y-%m-%d", "week": "%Y-%m-%d", "month": "%Y-%m"}
+
+
+def _bucket_start(dt: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())  # weeks start on Monday
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(dt: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return dt + timedelta(hours=1)
+    if granularity == "week":
+        return dt + timedelta(days=7)
+    if granularity == "month":
+        return (dt.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return dt + timedelta(days=1)
+
+
+def _local_range(range: str, start_date: str, end_date: str, zone: ZoneInfo):
+    """[start, end) in local wall-clock time of `zone`; the end date is included."""
+    now = datetime.now(zone).replace(tzinfo=None)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if range == "custom":
+        if not (start_date and end_date):
+            raise HTTPException(
+                status_code=400, detail="custom range needs start_date and end_date"
+            )
+        try:
+            start = datetime.fromisoformat(start_date)
+            end = datetime.fromisoformat(end_date)
+        except ValueError:
+            raise HTTPException(
+                status_code=400, detail="Invalid date format. Use YYYY-MM-DD."
+            )
+        if len(end_date) == 10:
+            end += timedelta(days=1)  # a plain date means the whole day
+        return start, end
+    starts = {
+        "day": midnight,
+        "week": now - timedelta(days=7),
+        "month": midnight.replace(day=1),
+        "year": midnight.replace(month=1, day=1),
+    }
+    if range not in starts:
+        raise HTTPException(
+            status_code=400, detail="range must be day, week, month, year or custom"
+        )
+    return starts[range], now + timedelta(seconds=1)
+
+
+@router.get("/timeseries", dependencies=[Depends(auth.get_current_admin)])
+def get_order_timeseries(
+    db: Session = Depends(get_db),
+    granularity: Literal["hour", "day", "week", "month"] = Query("day"),
+    tz: str = Query("UTC", description="IANA time zone for bucket boundaries"),
+    range: str = Query("week", description="Options: day, week, month, year, or custom"),
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    product_id: List[int] = Query(None, description="Only lines of these products"),
+    top: int = Query(5, ge=0, le=50),
+    top_by: Literal["quantity", "revenue"] = Query("quantity"),
+):
+    """
+    Collected orders bucketed by hour/day/week/month in the given time zone.
+
+    Returns parallel arrays: `buckets` (local bucket start) with `orders`,
+    `quantity` and `revenue` per bucket, plus per-bucket series for the `top`
+    products ranked by `top_by`. Empty buckets are included as zeros.
+    """
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown time zone {tz!r}")
+
+    start, end = _local_range(range, start_date, end_date, zone)
+    buckets: Dict[datetime, int] = {}
+    bucket = _bucket_start(start, granularity)
+    while bucket < end:
+        if len(buckets) >= TIMESERIES_MAX_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"More than {TIMESERIES_MAX_BUCKETS} buckets; use a coarser granularity",
+            )
+        buckets[bucket] = len(buckets)
+        bucket = _next_bucket(bucket, granularity)
+
+    def to_utc(local: datetime) -> datetime:
+        return local.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+    start_utc, end_utc = to_utc(start), to_utc(end)
+    lines = _order_lines_source(db, start_utc, end_utc)
+    # compare the stored "YYYY-MM-DD HH:MM:SS" text as-is, so the range stays index-friendly
+    created = type_coerce(lines.c.created_at, String)
+    conditions = [
+        lines.c.collected.is_(True),
+        created >= start_utc.strftime("%Y-%m-%d %H:%M:%S"),
+        created < end_utc.strftime("%Y-%m-%d %H:%M:%S"),
+    ]
+    if product_id:
+        conditions.append(lines.c.product_id.in_(product_id))
+
+    # aggregate per UTC quarter hour (every zone offset is a multiple of 15
+    # minutes), then fold the slots into local buckets here
+    slot = (
+        func.substr(created, 1, 14)
+        + cast(cast(func.substr(created, 15, 2), Integer) // 15 * 15, String)
+    ).label("slot")
+    slot_bucket: Dict[str, int] = {}
+
+    def index(value: str) -> int:
+        if value not in slot_bucket:
+            utc = datetime.fromisoformat(value[:13] + ":00") + timedelta(
+                minutes=int(value[14:])
+            )
+            local = utc.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None)
+            slot_bucket[value] = buckets.get(_bucket_start(local, granularity))
+        return slot_bucket[value]
+
+    size = len(buckets)
+    orders, quantity, revenue = [0] * size, [0] * size, [0.0] * size
+    # an order has one created_at, so per-slot distinct counts add up
+    for value, count, sold, amount in db.execute(
+        select(
+            slot,
+            func.count(func.distinct(lines.c.code)),
+            func.sum(lines.c.quantity),
+            func.sum(lines.c.line_total),
+        )
+        .where(*conditions)
+        .group_by(slot)
+    ):
+        i = index(value)
+        if i is not None:
+            orders[i] += count
+            quantity[i] += sold or 0
+            revenue[i] += amount or 0
+
+    top_series = {"product_ids": [], "names": [], "quantity": [], "revenue": []}
+    if top:
+        rows = db.execute(
+            select(
+                slot,
+                lines.c.product_id,
+                func.sum(lines.c.quantity),
+                func.sum(lines.c.line_total),
+            )
+            .where(*conditions)
+            .group_by(slot, lines.c.product_id)
+        ).all()
+        totals: Dict[int, List[float]] = {}
+        for _, pid, sold, amount in rows:
+            total = totals.setdefault(pid, [0, 0.0])
+            total[0] += sold or 0
+            total[1] += amount or 0
+        rank = 0 if top_by == "quantity" else 1
+        best = sorted(totals, key=lambda pid: totals[pid][rank], reverse=True)[:top]
+        series = {pid: ([0] * size, [0.0] * size) for pid in best}
+        for value, pid, sold, amount in rows:
+            i = index(value)
+            if pid in series and i is not None:
+                series[pid][0][i] += sold or 0
+                series[pid][1][i] += amount or 0
+        named = _with_names(db, [(pid, None, None) for pid in best])
+        top_series = {
+            "product_ids": best,
+            "names": [name for name, _, _ in named],
+            "quantity": [series[pid][0] for pid in best],
+            "revenue": [[round(r, 2) for r in series[pid][1]] for pid in best],
+        }
+
+    label = _BUCKET_LABELS[granularity]
+    return {
+        "granularity": granularity,
+        "tz": tz,
+        "buckets": [b.strftime(label) for b in buckets],
+        "orders": orders,
+        "quantity": quantity,
+        "revenue": [round(r, 2) for r in revenue],
+        "top": {"by": top_by, **top_series},
+    }
@@ -53,8 +53,12 @@ def refresh_token(req: schemas.TokenRefreshRequest, db: Session = Depends(get_db
         username: str = payload.get("sub")
         old_jti: str = payload.get("jti")
 
-        # revoke the old refresh token (token rotation)
-        auth.revoke_token(db, old_jti, reason="refresh_rotation")
+        # revoke the old refresh token (token rotation); losing the race means
+        # the same token was already used, possibly on another worker
+        if not auth.revoke_token(
+            db, old_jti, reason="refresh_rotation", expires_at=auth.token_expiry(payload)
+        ):
+            raise HTTPException(status_code=401, detail="Refresh token has been revoked")
 
         # generate new tokens
         access_token = auth.create_access_token({"sub": username})
@@ -94,12 +98,17 @@ def logout(
     """Invalidate the current access token (blacklist by jti)."""
     try:
         payload = jwt.decode(
-            token, auth.ACCESS_TOKEN_SECRET_KEY, algorithms=[auth.ALGORITHM]
+            token,
+            auth.ACCESS_TOKEN_SECRET_KEY,
+            algorithms=[auth.ALGORITHM],
+            audience="mtca",
         )
         jti = payload.get("jti")
         if not jti:
             raise HTTPException(status_code=400, detail="Invalid token")
-        auth.revoke_token(db, jti, reason="logout")
+        auth.revoke_token(
+            db, jti, reason="logout", expires_at=auth.token_expiry(payload)
+        )
         return {"detail": "Successfully logged out"}
     except JWTError:
         raise HTTPException(status_code=400, detail="Invalid token")
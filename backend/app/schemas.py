@@ -25,8 +25,38 @@ class ProductUpdate(BaseModel):
     image_url: Optional[str] = None
 
 
+class ProductUpsert(BaseModel):
+    """One row of a bulk import: updates product `id`, else the product named
+    `name` (if exactly one exists), else inserts a new product."""
+
+    id: Optional[int] = None
+    name: Optional[str] = None
+    price: Optional[float] = None
+    description: Optional[str] = None
+    quantity: Optional[int] = None
+    image_url: Optional[str] = None
+
+    @validator("price", "quantity")
+    def not_negative(cls, v):
+        if v is not None and v < 0:
+            raise ValueError("Must be >= 0")
+        return v
+
+
+class BulkRowError(BaseModel):
+    row: int  # 1-based position in the uploaded array / CSV data rows
+    error: str
+
+
+class BulkProductResult(BaseModel):
+    inserted: int
+    updated: int
+    errors: List[BulkRowError]
+
+
 class ProductResponse(ProductBase):
     id: int
+    thumbnail_url: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -87,6 +117,23 @@ class OrderResponse(OrderDetail):
     pass
 
 
+class OrderCodeList(BaseModel):
+    codes: List[str]
+
+    @validator("codes")
+    def codes_not_empty(cls, v):
+        if not v:
+            raise ValueError("Provide at least one order code")
+        if len(v) > 1000:
+            raise ValueError("At most 1000 codes per request")
+        return v
+
+
+class BulkCollectResponse(BaseModel):
+    updated: int  # orders that went from pending to collected
+    not_found: List[str]
+
+
 # ---------- User / Auth Schemas ----------
 class UserCreate(BaseModel):
     username: str
@@ -0,0 +1,51 @@
+# app/static.py
+"""
+Static file serving with long-lived caching for content-addressed images.
+
+Files under images/ named by their SHA-256 (see images.py) never change, so
+they are served with `Cache-Control: immutable` and a strong ETag derived from
+the hash. Clients that accept WebP get the precomputed variant when present.
+"""
+import os
+import re
+
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from .images import variant_path
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_CONTENT_ADDRESSED = re.compile(r"^images/(?:thumbs/)?([0-9a-f]{64})\.([a-z]+)$")
+
+
+class ImageStaticFiles(StaticFiles):
+    async def get_response(self, path: str, scope) -> Response:
+        match = _CONTENT_ADDRESSED.match(path.replace(os.sep, "/"))
+        if not match:
+            return await super().get_response(path, scope)
+
+        digest, ext = match.groups()
+        request_headers = Headers(scope=scope)
+        served, etag = path, f'"{digest}"'
+        cache_headers = {"Cache-Control": IMMUTABLE}
+
+        if ext != "webp":
+            cache_headers["Vary"] = "Accept"
+            variant = variant_path(path)
+            if "image/webp" in request_headers.get("accept", "") and await run_in_threadpool(
+                os.path.isfile, os.path.join(self.directory, variant)
+            ):
+                served, etag = variant, f'"{digest}-webp"'
+        cache_headers["ETag"] = etag
+
+        if_none_match = request_headers.get("if-none-match", "")
+        if etag in {tag.strip() for tag in if_none_match.split(",")}:
+            return Response(status_code=304, headers=cache_headers)
+
+        response = await super().get_response(served, scope)
+        if response.status_code == 200:
+            response.headers.update(cache_headers)
+        return response
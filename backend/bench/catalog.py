@@ -0,0 +1,94 @@
+# bench/catalog.py
+"""
+GET /products/ requests per second: the pre-serialized catalog snapshot
+(app/catalog.py) against the previous handler, which loaded every product
+through the ORM and let FastAPI validate and serialize it with
+response_model on every request.
+
+Both run in-process through TestClient on the same scratch database, so the
+numbers include routing and serialization but no network. Run from backend/:
+
+    python -m bench.catalog [products] [requests]   # default: 10000 200
+"""
+import sys
+import time
+
+from fastapi import APIRouter, Depends, FastAPI, Request, Response
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import crud, http_cache, schemas
+from app.database import get_db
+from app.routers import products as products_router
+
+from .common import discard, scratch_engine, seed_products, session
+
+legacy = APIRouter()
+
+
+@legacy.get(
+    "/bench/legacy-products/", response_model=list[schemas.ProductResponse]
+)
+def list_products_before(
+    request: Request, response: Response, db: Session = Depends(get_db)
+):
+    """routers.products.list_products before the catalog snapshot."""
+    etag = http_cache.version_etag(db, "products")
+    cached = http_cache.not_modified(request, etag)
+    if cached:
+        return cached
+    http_cache.set_etag(response, etag)
+    return crud.get_all_products(db)
+
+
+def requests_per_second(client: TestClient, url: str, count: int, headers=None):
+    client.get(url, headers=headers)  # warm up (builds the snapshot)
+    began = time.perf_counter()
+    for _ in range(count):
+        response = client.get(url, headers=headers)
+        assert response.status_code in (200, 304), response.status_code
+    return count / (time.perf_counter() - began)
+
+
+def run(products: int, count: int):
+    engine, path = scratch_engine()
+    seed_products(path, products)
+
+    def scratch_db():
+        db = session(engine)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    # not app.main: importing it migrates ./db.sqlite
+    app = FastAPI()
+    app.include_router(products_router.router, prefix="/products")
+    app.include_router(legacy)
+    app.dependency_overrides[get_db] = scratch_db
+    client = TestClient(app)
+
+    before = client.get("/bench/legacy-products/").json()
+    after = client.get("/products/").json()
+    assert before == after, "snapshot and response_model output differ"
+    etag = client.get("/products/").headers["etag"]
+    legacy_etag = client.get("/bench/legacy-products/").headers["etag"]
+
+    size = len(client.get("/products/").content) / 1e6
+    print(f"{products:,} products, {count} requests each ({size:.1f} MB body)")
+    for label, url, headers in (
+        ("ORM + response_model (before)", "/bench/legacy-products/", None),
+        ("catalog snapshot", "/products/", None),
+        ("If-None-Match, before", "/bench/legacy-products/",
+         {"If-None-Match": legacy_etag}),
+        ("If-None-Match, snapshot", "/products/", {"If-None-Match": etag}),
+    ):
+        rate = requests_per_second(client, url, count, headers)
+        print(f"  {label:<34} {rate:10.1f} req/s")
+
+    discard(engine, path)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    run(args[0] if args else 10_000, args[1] if len(args) > 1 else 200)
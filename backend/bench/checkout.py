@@ -0,0 +1,162 @@
+# bench/checkout.py
+"""
+Checkout throughput under contention: THREADS parallel buyers placing 3-item
+carts that all include one hot SKU, with the per-item `get_product` + Python
+stock decrement that create_orders used before batched conditional updates,
+against `crud.create_orders`.
+
+Each path runs twice: with the hot SKU stocked for every attempt (pure
+throughput), and for only half of them (sell-out, checked for overselling).
+Run from backend/:
+
+    python -m bench.checkout [checkouts_per_thread]   # default: 20
+"""
+import random
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app import crud, models, schemas
+
+from .common import PRODUCTS, discard, scratch_engine, seed_products, session
+
+THREADS = 50
+HOT = 1
+
+
+def legacy_create_orders(
+    db, orders: List[schemas.OrderCreate], user_id: Optional[int] = None
+):
+    """crud.create_orders as it was before batched conditional stock updates."""
+    if not orders:
+        raise HTTPException(status_code=400, detail="No order items provided")
+
+    total = 0.0
+    lines = []
+    for order_data in orders:
+        product = crud.get_product(db, order_data.product_id)
+        if not product:
+            raise HTTPException(
+                status_code=404, detail=f"Product {order_data.product_id} not found"
+            )
+        if product.quantity < order_data.quantity:
+            raise HTTPException(
+                status_code=400, detail=f"Insufficient quantity for {product.name}"
+            )
+
+        # decrement inventory
+        product.quantity -= order_data.quantity
+
+        unit_price = float(product.price or 0.0)
+        item_total = round(unit_price * order_data.quantity, 2)
+        total += item_total
+        lines.append((order_data, unit_price, item_total))
+
+    header = crud.create_order_header(db, user_id)
+    for order_data, unit_price, item_total in lines:
+        db.add(
+            models.Order(
+                product_id=order_data.product_id,
+                quantity=order_data.quantity,
+                code=header.code,
+                collected=False,
+                total_amount=item_total,
+                unit_price=unit_price,
+                line_total=item_total,
+                user_id=user_id,
+            )
+        )
+    header.total = round(total, 2)
+    header.item_count = len(lines)
+    db.commit()
+    return {"code": header.code, "total": round(total, 2)}
+
+
+def run(place, per_thread: int, sell_out: bool):
+    engine, path = scratch_engine()
+    attempts = THREADS * per_thread
+    stock = attempts // 2 if sell_out else attempts
+    seed_products(path, quantity=attempts * 10)
+    with engine.begin() as conn:
+        conn.execute(
+            models.Product.__table__.update()
+            .where(models.Product.id == HOT)
+            .values(quantity=stock)
+        )
+
+    outcomes = {"placed": 0, "sold out": 0, "locked": 0}
+    lock = threading.Lock()
+    start = threading.Barrier(THREADS + 1)
+
+    def buyer(seed: int):
+        rng = random.Random(seed)
+        db = session(engine)
+        start.wait()
+        for _ in range(per_thread):
+            cart = [schemas.OrderCreate(product_id=HOT, quantity=1)] + [
+                schemas.OrderCreate(product_id=rng.randint(2, PRODUCTS), quantity=1)
+                for _ in range(2)
+            ]
+            try:
+                place(db, cart)
+                outcome = "placed"
+            except HTTPException:
+                db.rollback()
+                outcome = "sold out"
+            except OperationalError:  # "database is locked" after the busy timeout
+                db.rollback()
+                outcome = "locked"
+            with lock:
+                outcomes[outcome] += 1
+        db.close()
+
+    threads = [threading.Thread(target=buyer, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    with engine.connect() as conn:
+        left = conn.execute(
+            select(models.Product.quantity).where(models.Product.id == HOT)
+        ).scalar()
+        sold = conn.execute(
+            select(func.coalesce(func.sum(models.Order.quantity), 0)).where(
+                models.Order.product_id == HOT
+            )
+        ).scalar()
+    discard(engine, path)
+
+    print(
+        f"  {attempts / elapsed:8.0f} attempts/s  {outcomes['placed'] / elapsed:8.0f} orders/s"
+        f"  placed {outcomes['placed']}, sold out {outcomes['sold out']},"
+        f" locked {outcomes['locked']}; hot SKU stock {stock}, sold {sold},"
+        f" left {left}, oversold {max(0, sold - stock)}"
+    )
+
+
+def main(per_thread: int):
+    print(f"{THREADS} threads x {per_thread} checkouts, 3-item carts with one hot SKU")
+    paths = [
+        ("legacy per-item get_product + Python decrement", legacy_create_orders),
+        (
+            "crud.create_orders (batched conditional UPDATE)",
+            lambda db, cart: crud.create_orders(db, cart),
+        ),
+    ]
+    for label, place in paths:
+        print(f"{label}:")
+        for sell_out in (False, True):
+            run(place, per_thread, sell_out)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,74 @@
+# bench/columnar_stats.py
+"""
+GET /stats backends side by side: the NumPy column store (app/columnar.py)
+against the SQL paths (raw order lines and daily rollups), plus what the
+column store costs to build, snapshot, memory-map and sync.
+
+Needs numpy. 10M lines take several minutes to seed. Run from backend/:
+
+    python -m bench.columnar_stats [lines ...]   # default: 1000000 10000000
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+from app import columnar
+from app.routers import stats
+
+from .common import (
+    best_of,
+    discard,
+    rebuild_rollups,
+    report,
+    scratch_engine,
+    seed_orders,
+    seed_products,
+    session,
+)
+
+
+def timed(fn) -> float:
+    began = time.perf_counter()
+    fn()
+    return time.perf_counter() - began
+
+
+def run(lines: int):
+    engine, path = scratch_engine()
+    columnar.STATS_SNAPSHOT_DIR = os.path.join(os.path.dirname(path), "stats_snapshot")
+    seed_products(path)
+    orders = seed_orders(path, lines)
+    rebuild_rollups(engine)
+    db = session(engine)
+    print(f"{lines:,} lines / {orders:,} orders")
+
+    built = columnar.ColumnStore()
+    report("columnar: build from database", timed(lambda: built.load(db)))
+    report("columnar: save snapshot", timed(built.save))
+    mapped = columnar.ColumnStore()
+    report("columnar: load snapshot (mmap)", timed(lambda: mapped.load(db)))
+    report("columnar: sync, nothing new", best_of(lambda: mapped.sync(db)))
+
+    year = datetime.utcnow().replace(month=1, day=1, hour=0, minute=0, second=0)
+    for label, start in (("all time", None), ("this year", year)):
+        columnar.store = mapped
+        sql = stats._raw_stats(db, start, None)
+        column = stats._columnar_stats(db, start, None)
+        assert sql[0] == column[0] and round(sql[1], 2) == round(column[1], 2)
+        print(f" {label}")
+        for name, compute in (
+            ("raw SQL", stats._raw_stats),
+            ("rollup SQL", stats._rollup_stats),
+            ("columnar", stats._columnar_stats),
+        ):
+            report(name, best_of(lambda: compute(db, start, None)))
+    db.close()
+    discard(engine, path)
+
+
+if __name__ == "__main__":
+    if columnar.np is None:
+        sys.exit("bench.columnar_stats needs numpy")
+    for size in [int(arg) for arg in sys.argv[1:]] or [1_000_000, 10_000_000]:
+        run(size)
@@ -0,0 +1,129 @@
+# bench/common.py
+"""
+Shared helpers for the benchmark scripts: a scratch SQLite database with the
+current schema, synthetic order data, and a best-of-N timer.
+
+The scripts never touch ./db.sqlite. Run them from backend/, e.g.
+`python -m bench.order_lines`.
+"""
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import rollups
+from app.migrations import run_migrations
+
+PRODUCTS = 500
+SEED_BATCH = 100_000
+
+
+def scratch_engine(name: str = "bench.sqlite"):
+    """A migrated, empty database in a fresh temp directory."""
+    path = os.path.join(tempfile.mkdtemp(prefix="mtca-bench-"), name)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    run_migrations(engine)
+    return engine, path
+
+
+def discard(engine, path: str):
+    engine.dispose()
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def session(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def seed_products(path: str, count: int = PRODUCTS, quantity: int = 1000):
+    con = sqlite3.connect(path)
+    con.executemany(
+        "INSERT INTO products (id, name, price, quantity, description) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [
+            (i, f"Product {i}", round(1 + (i % 40) * 0.75, 2), quantity, f"Item number {i}")
+            for i in range(1, count + 1)
+        ],
+    )
+    con.commit()
+    con.close()
+
+
+def seed_orders(path: str, lines: int, collected: bool = True, days: int = 730):
+    """
+    `lines` order lines (1-4 per order) over the last `days` days, with their
+    order headers. Collected orders get collected_seq 1; rollups are rebuilt.
+    Returns the number of orders.
+    """
+    rng = random.Random(42)
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA synchronous = OFF")
+    start = datetime.utcnow() - timedelta(days=days)
+    prices = {i: round(1 + (i % 40) * 0.75, 2) for i in range(1, PRODUCTS + 1)}
+
+    made = orders = 0
+    while made < lines:
+        order_lines, headers = [], []
+        while made < lines and len(order_lines) < SEED_BATCH:
+            code = f"B{orders:07d}"
+            created_at = (start + timedelta(seconds=rng.randrange(days * 86400))).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+            total = 0.0
+            count = min(1 + orders % 4, lines - made)
+            for _ in range(count):
+                product_id = rng.randint(1, PRODUCTS)
+                quantity = rng.randint(1, 5)
+                line_total = round(prices[product_id] * quantity, 2)
+                total += line_total
+                order_lines.append(
+                    (product_id, 1, quantity, code, collected, line_total,
+                     created_at, prices[product_id], line_total)
+                )
+            headers.append(
+                (code, 1, round(total, 2), count, collected, created_at,
+                 1 if collected else None)
+            )
+            made += count
+            orders += 1
+        con.executemany(
+            "INSERT INTO orders (product_id, user_id, quantity, code, collected, "
+            "total_amount, created_at, unit_price, line_total) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            order_lines,
+        )
+        con.executemany(
+            "INSERT INTO order_headers (code, user_id, total, item_count, collected, "
+            "created_at, collected_seq, archived) VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            headers,
+        )
+        con.commit()
+    con.execute("INSERT OR REPLACE INTO counters (name, value) VALUES ('collect_seq', 1)")
+    con.commit()
+    con.close()
+    return orders
+
+
+def rebuild_rollups(engine):
+    with engine.begin() as conn:
+        rollups.rebuild(conn)
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    """Fastest of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - began)
+    return best
+
+
+def report(label: str, seconds: float):
+    print(f"  {label:<34} {seconds * 1000:10.1f} ms")
@@ -0,0 +1,114 @@
+# bench/order_lines.py
+"""
+Order line loading: the per-row Python loop that resolved snapshot prices
+before app/aggregation.py, against `aggregation.order_lines` (prices resolved
+in SQL).
+
+Every order's lines are loaded in pages of PAGE codes, like the order
+listings do. Run from backend/:
+
+    python -m bench.order_lines [lines ...]   # default: 10000 100000 1000000
+"""
+import sys
+from typing import Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from app import models
+from app.aggregation import order_lines
+
+from .common import (
+    best_of,
+    discard,
+    report,
+    scratch_engine,
+    seed_orders,
+    seed_products,
+    session,
+)
+
+PAGE = 500
+
+
+def legacy_order_items(db, codes: List[str]) -> Dict[str, List[Dict]]:
+    """crud._order_items_by_code as it was before app/aggregation.py."""
+    items: Dict[str, List[Dict]] = {code: [] for code in codes}
+    if not codes:
+        return items
+
+    orders = (
+        db.query(models.Order)
+        .options(joinedload(models.Order.product))
+        .filter(models.Order.code.in_(codes))
+        .order_by(models.Order.id.asc())
+        .all()
+    )
+
+    for ord_row in orders:
+        product = ord_row.product
+        product_name = product.name if product else "Unknown"
+        unit_price = ord_row.unit_price
+        line_total = ord_row.line_total
+        quantity = ord_row.quantity or 0
+
+        if unit_price is not None:
+            item = {
+                "product_name": product_name,
+                "quantity": quantity,
+                "price": float(unit_price),
+                "subtotal": float(round(unit_price * quantity, 2)),
+            }
+        elif line_total is not None:
+            item = {
+                "product_name": product_name,
+                "quantity": quantity,
+                "subtotal": float(line_total),
+            }
+        elif product is not None and product.price is not None:
+            price = float(product.price)
+            item = {
+                "product_name": product_name,
+                "quantity": quantity,
+                "price": price,
+                "subtotal": round(price * quantity, 2),
+            }
+        else:
+            item = {
+                "product_name": product_name,
+                "quantity": quantity,
+                "subtotal": float(ord_row.total_amount or 0.0),
+            }
+        items[ord_row.code].append(item)
+    return items
+
+
+def run(lines: int):
+    engine, path = scratch_engine()
+    seed_products(path)
+    orders = seed_orders(path, lines)
+    db = session(engine)
+    codes = list(db.execute(select(models.OrderHeader.code)).scalars())
+    pages = [codes[i : i + PAGE] for i in range(0, len(codes), PAGE)]
+
+    def legacy():
+        for page in pages:
+            legacy_order_items(db, page)
+            db.expunge_all()
+
+    def current():
+        for page in pages:
+            order_lines(db, page)
+
+    print(f"{lines:,} lines / {orders:,} orders, {len(pages)} pages of {PAGE}")
+    # warm the page cache once so neither side pays for the first read
+    current()
+    report("python loop (before)", best_of(legacy))
+    report("aggregation.order_lines", best_of(current))
+    db.close()
+    discard(engine, path)
+
+
+if __name__ == "__main__":
+    for size in [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]:
+        run(size)
@@ -0,0 +1,95 @@
+# bench/raw_stats.py
+"""
+GET /stats on the raw order lines (STATS_BACKEND=raw): the four-pass query
+set used before, against the current single GROUP BY (month, product) scan
+plus a distinct-code count. The rollup backend is timed for reference.
+
+Run from backend/:
+
+    python -m bench.raw_stats [lines]   # default: 1000000
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import func
+
+from app import models
+from app.routers import stats
+
+from .common import (
+    best_of,
+    discard,
+    rebuild_rollups,
+    report,
+    scratch_engine,
+    seed_orders,
+    seed_products,
+    session,
+)
+
+
+def legacy_raw_stats(db, start, end):
+    """stats._raw_stats before the single grouped scan."""
+    lines = stats._order_lines_source(db, start, end)
+
+    query = db.query(lines).filter(lines.c.collected == True)  # noqa: E712
+    if start is not None:
+        query = query.filter(lines.c.created_at >= start)
+    if end is not None:
+        query = query.filter(lines.c.created_at <= end)
+    revenue_field = lines.c.line_total
+
+    total_orders = (
+        query.with_entities(func.count(func.distinct(lines.c.code))).scalar() or 0
+    )
+    total_revenue = query.with_entities(func.sum(revenue_field)).scalar() or 0
+    monthly_stats = (
+        query.with_entities(
+            func.strftime("%Y-%m", lines.c.created_at).label("month"),
+            func.sum(revenue_field).label("revenue"),
+        )
+        .group_by("month")
+        .order_by("month")
+        .all()
+    )
+    top_products = (
+        query.join(models.Product, models.Product.id == lines.c.product_id)
+        .with_entities(
+            models.Product.name,
+            func.sum(lines.c.quantity).label("total_sold"),
+            func.sum(revenue_field).label("revenue"),
+        )
+        .group_by(models.Product.name)
+        .order_by(func.sum(lines.c.quantity).desc())
+        .limit(5)
+        .all()
+    )
+    return total_orders, total_revenue, monthly_stats, top_products
+
+
+def run(lines: int):
+    engine, path = scratch_engine()
+    seed_products(path)
+    orders = seed_orders(path, lines)
+    rebuild_rollups(engine)
+    db = session(engine)
+
+    year = datetime.utcnow().replace(month=1, day=1, hour=0, minute=0, second=0)
+    print(f"{lines:,} lines / {orders:,} orders")
+    for label, start in (("all time", None), ("this year", year)):
+        before = legacy_raw_stats(db, start, None)
+        after = stats._raw_stats(db, start, None)
+        assert before[0] == after[0] and round(before[1], 2) == round(after[1], 2)
+        print(f" {label}")
+        for name, compute in (
+            ("raw, four passes (before)", legacy_raw_stats),
+            ("raw, grouped scan", stats._raw_stats),
+            ("rollup (reference)", stats._rollup_stats),
+        ):
+            report(name, best_of(lambda: compute(db, start, None)))
+    db.close()
+    discard(engine, path)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
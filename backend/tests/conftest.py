@@ -0,0 +1,81 @@
+# tests/conftest.py
+import os
+import sys
+
+os.environ.setdefault("ACCESS_TOKEN_SECRET_KEY", "test-access-secret")
+os.environ.setdefault("REFRESH_TOKEN_SECRET_KEY", "test-refresh-secret")
+os.environ.setdefault("ORDER_CODE_KEY", "test-order-code-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models, schemas
+from app.cache import order_cache, stats_cache
+from app.migrations import run_migrations
+
+
+def pytest_addoption(parser):
+    parser.addoption("--runslow", action="store_true", help="also run @pytest.mark.slow")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: long-running, skipped without --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+    skip = pytest.mark.skip(reason="needs --runslow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.sqlite'}",
+        connect_args={"check_same_thread": False},
+    )
+    run_migrations(engine)
+    order_cache.clear()
+    stats_cache.clear()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+def add_user(db, username="alice", is_admin=False) -> models.User:
+    # password hashing is irrelevant here, so skip argon2
+    user = models.User(username=username, hashed_password="x", is_admin=is_admin)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def add_product(db, name="Milk", price=1.5, quantity=100) -> models.Product:
+    product = models.Product(name=name, price=price, quantity=quantity, description="")
+    db.add(product)
+    db.commit()
+    return product
+
+
+def cart(*items):
+    """cart((product_id, quantity), ...) -> list of schemas.OrderCreate"""
+    return [
+        schemas.OrderCreate(product_id=product_id, quantity=quantity)
+        for product_id, quantity in items
+    ]
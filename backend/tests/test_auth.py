@@ -0,0 +1,42 @@
+# tests/test_auth.py
+import pytest
+from fastapi import HTTPException
+
+from app import auth
+
+from conftest import add_user
+
+
+def test_events_token_authenticates_admins(db):
+    admin = add_user(db, "boss", is_admin=True)
+    token = auth.create_events_token({"sub": admin.username})
+    assert auth.get_events_admin(token=token, bearer=None, db=db).id == admin.id
+
+
+def test_events_token_requires_an_admin(db):
+    user = add_user(db, "alice")
+    token = auth.create_events_token({"sub": user.username})
+    with pytest.raises(HTTPException) as e:
+        auth.get_events_admin(token=token, bearer=None, db=db)
+    assert e.value.status_code == 403
+
+
+def test_access_tokens_are_not_events_tokens(db):
+    admin = add_user(db, "boss", is_admin=True)
+    access = auth.create_access_token({"sub": admin.username})
+    with pytest.raises(HTTPException) as e:
+        auth.get_events_admin(token=access, bearer=None, db=db)
+    assert e.value.status_code == 401
+
+    events = auth.create_events_token({"sub": admin.username})
+    with pytest.raises(HTTPException):
+        auth.get_current_user(events, db)
+
+
+def test_events_feed_still_accepts_a_bearer_token(db):
+    admin = add_user(db, "boss", is_admin=True)
+    access = auth.create_access_token({"sub": admin.username})
+    assert auth.get_events_admin(token=None, bearer=access, db=db).id == admin.id
+    with pytest.raises(HTTPException) as e:
+        auth.get_events_admin(token=None, bearer=None, db=db)
+    assert e.value.status_code == 401
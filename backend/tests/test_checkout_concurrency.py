@@ -0,0 +1,45 @@
+# tests/test_checkout_concurrency.py
+import threading
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from app import crud, models
+
+from conftest import add_product, add_user, cart
+
+
+def test_parallel_checkouts_never_oversell_a_hot_sku(db, session_factory):
+    user = add_user(db)
+    product = add_product(db, "Hot item", price=4.0, quantity=20)
+    buyers = 50
+    start = threading.Barrier(buyers)
+    outcomes = []
+
+    def checkout():
+        session = session_factory()
+        try:
+            start.wait()
+            crud.create_orders(session, cart((product.id, 1)), user.id)
+            outcomes.append("ok")
+        except HTTPException as e:
+            outcomes.append(e.status_code)
+        except Exception as e:  # anything else is a bug
+            outcomes.append(repr(e))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=checkout) for _ in range(buyers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes.count("ok") == 20
+    assert outcomes.count(400) == buyers - 20
+    db.expire_all()
+    assert db.get(models.Product, product.id).quantity == 0
+    orders = db.execute(
+        select(func.count()).where(models.Order.product_id == product.id)
+    ).scalar()
+    assert orders == 20
@@ -0,0 +1,44 @@
+# tests/test_idempotency.py
+import pytest
+from fastapi import HTTPException
+
+from app import crud, models
+
+from conftest import add_product, add_user, cart
+
+
+def test_replay_with_the_same_body_returns_the_original_order(db):
+    user = add_user(db)
+    milk = add_product(db)
+    body = cart((milk.id, 2))
+    placed = crud.create_orders(db, body, user.id, idempotency_key="k-1")
+
+    replay = crud.get_idempotent_response(
+        db, user.id, "k-1", crud.order_request_hash(cart((milk.id, 2)))
+    )
+    assert replay == placed
+
+
+def test_replay_with_a_different_body_is_rejected(db):
+    user = add_user(db)
+    milk = add_product(db)
+    crud.create_orders(db, cart((milk.id, 2)), user.id, idempotency_key="k-1")
+
+    with pytest.raises(HTTPException) as e:
+        crud.get_idempotent_response(
+            db, user.id, "k-1", crud.order_request_hash(cart((milk.id, 3)))
+        )
+    assert e.value.status_code == 422
+
+
+def test_keys_stored_without_a_hash_still_replay(db):
+    user = add_user(db)
+    milk = add_product(db)
+    placed = crud.create_orders(db, cart((milk.id, 2)), user.id, idempotency_key="k-1")
+    db.query(models.IdempotencyKey).update({"request_hash": None})
+    db.commit()
+
+    replay = crud.get_idempotent_response(
+        db, user.id, "k-1", crud.order_request_hash(cart((milk.id, 5)))
+    )
+    assert replay == placed
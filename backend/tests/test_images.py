@@ -0,0 +1,37 @@
+# tests/test_images.py
+import pytest
+
+from app import images
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.mark.parametrize(
+    "mode, ext, expected",
+    [
+        ("CMYK", ".jpg", "RGB"),
+        ("L", ".jpeg", "L"),
+        ("RGB", ".jpg", "RGB"),
+        ("CMYK", ".png", "RGBA"),
+        ("RGBA", ".png", "RGBA"),
+    ],
+)
+def test_render_derivatives_converts_for_the_target_format(
+    tmp_path, mode, ext, expected
+):
+    src = str(tmp_path / f"src{ext}")
+    thumb = str(tmp_path / f"thumb{ext}")
+    fmt = Image.registered_extensions()[ext]
+    source = Image.new(mode, (800, 600))
+    if fmt == "PNG" and mode == "CMYK":
+        # PNG can't store CMYK; write a CMYK TIFF under a .png name
+        source.save(src, format="TIFF")
+    else:
+        source.save(src, format=fmt)
+
+    images._render_derivatives(src, thumb, (320, 320), webp=False)
+
+    with Image.open(thumb) as rendered:
+        assert rendered.format == fmt
+        assert rendered.mode == expected
+        assert max(rendered.size) == 320
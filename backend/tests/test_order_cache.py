@@ -0,0 +1,73 @@
+# tests/test_order_cache.py
+from app import crud
+from app.cache import order_cache
+
+from conftest import add_product, add_user, cart
+
+
+def test_get_order_by_code_caches_the_detail(db):
+    user = add_user(db)
+    milk = add_product(db)
+    code = crud.create_orders(db, cart((milk.id, 2)), user.id)["code"]
+
+    detail = crud.get_order_by_code(db, code)
+    version = crud.get_versions(db, "orders")["orders"]
+    assert order_cache.get(code) == (version, detail)
+
+
+def test_cached_detail_is_not_served_for_a_newer_version(db, session_factory):
+    user = add_user(db)
+    milk = add_product(db)
+    code = crud.create_orders(db, cart((milk.id, 2)), user.id)["code"]
+    version = crud.get_versions(db, "orders")["orders"]
+    assert crud.get_order_by_code(db, code, version)["collected"] is False
+
+    # another worker collects: the shared version moves, this cache doesn't hear
+    other = session_factory()
+    other.query(crud.models.OrderHeader).filter_by(code=code).update({"collected": True})
+    crud.bump_versions(other, "orders")
+    other.commit()
+    other.close()
+
+    db.expire_all()
+    newer = crud.get_versions(db, "orders")["orders"]
+    assert newer == version + 1
+    assert crud.get_order_by_code(db, code, newer)["collected"] is True
+    assert order_cache.get(code)[0] == newer
+
+
+def test_read_racing_an_invalidation_is_not_cached(db, monkeypatch):
+    user = add_user(db)
+    milk = add_product(db)
+    code = crud.create_orders(db, cart((milk.id, 2)), user.id)["code"]
+    header_lines = crud._header_lines
+
+    def collect_meanwhile(db, headers):
+        lines = header_lines(db, headers)
+        crud.mark_orders_collected(db, [code])  # commits and invalidates
+        return lines
+
+    monkeypatch.setattr(crud, "_header_lines", collect_meanwhile)
+    crud.get_order_by_code(db, code)
+    assert order_cache.get(code) is None
+
+    monkeypatch.setattr(crud, "_header_lines", header_lines)
+    assert crud.get_order_by_code(db, code)["collected"] is True
+
+
+def test_renaming_a_product_bumps_the_orders_version(db):
+    milk = add_product(db)
+    bread = add_product(db, "Bread")
+    before = crud.get_versions(db, "orders")["orders"]
+
+    crud.update_product(db, milk.id, crud.schemas.ProductUpdate(price=2.0))
+    crud.update_product(db, milk.id, crud.schemas.ProductUpdate(name="Milk"))
+    assert crud.get_versions(db, "orders")["orders"] == before
+
+    crud.update_product(db, milk.id, crud.schemas.ProductUpdate(name="Oat milk"))
+    assert crud.get_versions(db, "orders")["orders"] == before + 1
+
+    crud.bulk_upsert_products(db, [{"id": bread.id, "quantity": 5}])
+    assert crud.get_versions(db, "orders")["orders"] == before + 1
+    crud.bulk_upsert_products(db, [{"id": bread.id, "name": "Rye bread"}])
+    assert crud.get_versions(db, "orders")["orders"] == before + 2
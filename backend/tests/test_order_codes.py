@@ -0,0 +1,109 @@
+# tests/test_order_codes.py
+import multiprocessing
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, order_codes
+
+from conftest import add_product, add_user, cart
+
+KEY = b"test-order-code-key"
+
+
+@pytest.mark.parametrize(
+    "count", [100_000, pytest.param(3_000_000, marks=pytest.mark.slow)]
+)
+def test_code_for_is_distinct_over_a_large_range(count):
+    codes = [order_codes.code_for(n, KEY) for n in range(1, count + 1)]
+    assert len(set(codes)) == len(codes)
+    assert all(
+        len(code) == order_codes.CODE_LENGTH
+        and set(code) <= set(order_codes.ALPHABET)
+        for code in codes
+    )
+
+
+def test_code_for_depends_on_the_key():
+    first = [order_codes.code_for(n, KEY) for n in range(1, 101)]
+    second = [order_codes.code_for(n, b"another-key") for n in range(1, 101)]
+    assert sum(a == b for a, b in zip(first, second)) < 5
+
+
+def test_permute_stays_in_the_code_space():
+    top = order_codes.CODE_SPACE - 1
+    for value in (0, 1, top - 1, top):
+        assert 0 <= order_codes.permute(value, KEY) < order_codes.CODE_SPACE
+
+
+def test_generated_key_is_stored_and_reused(db, monkeypatch):
+    monkeypatch.setattr(crud, "ORDER_CODE_KEY", None)
+    monkeypatch.setattr(crud, "_order_code_key", None)
+    key = crud.order_code_key(db)
+    db.commit()
+
+    monkeypatch.setattr(crud, "_order_code_key", None)
+    assert crud.order_code_key(db) == key
+    stored = db.get(models.Counter, "order_code_key")
+    assert stored.value.to_bytes(8, "big") == key
+
+
+def test_generated_key_survives_a_rolled_back_first_checkout(db, monkeypatch):
+    monkeypatch.setattr(crud, "ORDER_CODE_KEY", None)
+    monkeypatch.setattr(crud, "_order_code_key", None)
+    user = add_user(db)
+    milk = add_product(db, quantity=1)
+
+    with pytest.raises(HTTPException):
+        crud.create_orders(db, cart((milk.id, 5)), user.id)  # out of stock
+    key = crud.order_code_key(db)
+
+    stored = db.get(models.Counter, "order_code_key")
+    assert stored is not None and stored.value.to_bytes(8, "big") == key
+    code = crud.create_orders(db, cart((milk.id, 1)), user.id)["code"]
+    assert code == order_codes.code_for(1, key)
+
+
+def _allocate_headers(url, count, codes):
+    engine = create_engine(url, connect_args={"timeout": 30})
+    session = sessionmaker(bind=engine)()
+    allocated = []
+    for _ in range(count):
+        allocated.append(crud.create_order_header(session).code)
+        session.commit()
+    session.close()
+    engine.dispose()
+    codes.extend(allocated)
+
+
+def test_create_order_header_across_processes(engine, monkeypatch):
+    # without ORDER_CODE_KEY the workers also race to create the stored key
+    monkeypatch.delenv("ORDER_CODE_KEY")
+    workers, per_worker = 4, 50
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        codes = manager.list()
+        processes = [
+            context.Process(
+                target=_allocate_headers, args=(str(engine.url), per_worker, codes)
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+        assert [process.exitcode for process in processes] == [0] * workers
+        codes = list(codes)
+
+    assert len(codes) == workers * per_worker
+    assert len(set(codes)) == len(codes)
+    with engine.connect() as conn:
+        headers = conn.execute(select(func.count()).select_from(models.OrderHeader))
+        assert headers.scalar() == len(codes)
+        stored_keys = conn.execute(
+            select(func.count()).where(models.Counter.name == "order_code_key")
+        )
+        assert stored_keys.scalar() == 1
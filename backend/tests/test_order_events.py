@@ -0,0 +1,40 @@
+# tests/test_order_events.py
+import asyncio
+
+from app import crud
+from app.routers import orders
+
+
+class ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def test_keep_alive_resyncs_after_another_workers_write(
+    db, session_factory, monkeypatch
+):
+    monkeypatch.setattr(orders, "SessionLocal", session_factory)
+    monkeypatch.setattr(orders, "SSE_KEEPALIVE_SECONDS", 0.05)
+
+    async def read_stream():
+        response = await orders.order_events(
+            request=ConnectedRequest(), db=db, last_event_id=None, since=None
+        )
+        body = response.body_iterator
+        chunks = [await body.__anext__(), await body.__anext__()]
+
+        # another worker's write never reaches this process's bus
+        other = session_factory()
+        crud.bump_versions(other, "orders")
+        other.commit()
+        other.close()
+
+        chunks += [await body.__anext__(), await body.__anext__()]
+        await body.aclose()
+        return chunks
+
+    retry, idle, changed, settled = asyncio.run(read_stream())
+    assert retry.startswith("retry:")
+    assert idle == ": keep-alive\n\n"
+    assert changed == "event: resync\ndata: {}\n\n"
+    assert settled == ": keep-alive\n\n"
@@ -0,0 +1,237 @@
+# tests/test_query_plans.py
+"""
+Query-plan regression checks: every statement issued by the hot crud and
+stats paths is captured and run through EXPLAIN QUERY PLAN, and any full scan
+of a real table fails the test.
+"""
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text
+
+from app import archive, crud
+from app.database import Base
+from app.routers import stats
+
+from conftest import add_product, add_user, cart
+
+_PLANNED = ("SELECT", "WITH", "UPDATE", "DELETE")
+# "SCAN orders" is a full table scan; "SCAN orders USING INDEX ..." is an
+# ordered index walk, and scans of subqueries/CTEs aren't tables
+_SCAN = re.compile(r"^SCAN (\w+)(.*)$")
+
+
+@contextmanager
+def captured_statements(engine):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(_PLANNED):
+            if executemany:
+                parameters = parameters[0]
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def query_plans(engine, statements):
+    """[(statement, [plan detail, ...])] for the captured statements."""
+    plans = []
+    with engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        for statement, parameters in statements:
+            rows = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plans.append((statement, [row[3] for row in rows.fetchall()]))
+        cursor.close()
+    return plans
+
+
+def full_scans(plans):
+    tables = set(Base.metadata.tables)
+    found = []
+    for statement, details in plans:
+        for detail in details:
+            match = _SCAN.match(detail)
+            if match and match.group(1) in tables and "INDEX" not in match.group(2):
+                found.append(f"{detail}\n    in: {' '.join(statement.split())}")
+    return found
+
+
+def assert_no_full_scans(engine, statements):
+    assert statements, "nothing was captured"
+    scans = full_scans(query_plans(engine, statements))
+    assert not scans, "full table scans:\n" + "\n".join(scans)
+
+
+@pytest.fixture
+def shop(db):
+    """A few users, products and orders (some collected, some archived)."""
+    alice = add_user(db, "alice")
+    bob = add_user(db, "bob")
+    milk = add_product(db, "Milk", 1.5, 1000)
+    bread = add_product(db, "Bread", 2.0, 1000)
+    eggs = add_product(db, "Free range eggs", 3.25, 1000)
+
+    codes = []
+    for i in range(12):
+        user = alice if i % 2 else bob
+        codes.append(
+            crud.create_orders(db, cart((milk.id, 1 + i % 3), (bread.id, 1)), user.id)[
+                "code"
+            ]
+        )
+    crud.mark_orders_collected(db, codes[:8])
+
+    # age a few collected orders past the archive cutoff
+    old = (datetime.utcnow() - timedelta(days=800)).strftime("%Y-%m-%d %H:%M:%S")
+    for table in ("orders", "order_headers"):
+        db.execute(
+            text(f"UPDATE {table} SET created_at = :old WHERE code IN (:a, :b)"),
+            {"old": old, "a": codes[0], "b": codes[1]},
+        )
+    db.commit()
+    archive.archive_collected_orders(db, older_than_days=365)
+    return {"alice": alice, "bob": bob, "products": (milk, bread, eggs), "codes": codes}
+
+
+def test_product_queries_use_indexes(engine, db, shop):
+    milk, bread, eggs = shop["products"]
+    # the first plain catalog page is a rowid walk with LIMIT, so it stays out
+    _, cursor = crud.search_products(db, q=None, limit=1)
+    with captured_statements(engine) as statements:
+        crud.get_product(db, milk.id)
+        crud.search_products(db, q="egg", limit=1)
+        crud.search_products(db, q=None, limit=1, cursor=cursor, in_stock=True)
+        crud.update_product(db, eggs.id, crud.schemas.ProductUpdate(price=3.5))
+        crud.bulk_upsert_products(
+            db, [{"id": bread.id, "quantity": 50}, {"name": "Milk", "price": 1.6}]
+        )
+        with pytest.raises(crud.HTTPException):
+            crud.delete_product(db, milk.id)  # has orders
+    assert_no_full_scans(engine, statements)
+
+
+def test_checkout_and_collect_use_indexes(engine, db, shop):
+    milk, bread, _ = shop["products"]
+    alice = shop["alice"]
+    with captured_statements(engine) as statements:
+        placed = crud.create_orders(
+            db, cart((milk.id, 1), (bread.id, 2)), alice.id, idempotency_key="k-1"
+        )
+        crud.get_idempotent_response(db, alice.id, "k-1")
+        crud.mark_orders_collected(db, [placed["code"], shop["codes"][9], "NOPE00"])
+        crud.purge_expired_idempotency_keys(db)
+        crud.get_versions(db, "orders", "products")
+    assert_no_full_scans(engine, statements)
+
+
+def test_order_reads_use_indexes(engine, db, shop):
+    alice = shop["alice"]
+    codes = shop["codes"]
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    with captured_statements(engine) as statements:
+        page, cursor = crud.get_orders_page(db, limit=3)
+        crud.get_orders_page(db, limit=3, cursor=cursor)
+        crud.get_orders_page(db, limit=3, collected=False)
+        crud.get_orders_page(db, limit=3, user_id=alice.id)
+        crud.get_orders_page(db, limit=3, start=week_ago, end=datetime.utcnow())
+        crud.get_order_by_code(db, codes[0])  # archived
+        crud.get_order_by_code(db, codes[5].lower())
+        crud.get_user_orders_grouped(db, alice.id)
+        crud.get_user_order_by_code(db, alice.id, codes[3])
+    assert_no_full_scans(engine, statements)
+
+
+@pytest.mark.parametrize("backend", ["rollup", "raw"])
+@pytest.mark.parametrize("range_", ["day", "week", "month", "year", "custom"])
+def test_stats_use_indexes(engine, db, shop, monkeypatch, backend, range_):
+    monkeypatch.setattr(stats, "STATS_BACKEND", backend)
+    with captured_statements(engine) as statements:
+        stats.get_order_stats(
+            db=db, range=range_, start_date="2020-01-01", end_date="2030-01-01"
+        )
+    assert_no_full_scans(engine, statements)
+
+
+@pytest.mark.parametrize("granularity", ["hour", "day", "week", "month"])
+def test_timeseries_uses_indexes(engine, db, shop, granularity):
+    milk = shop["products"][0]
+    with captured_statements(engine) as statements:
+        stats.get_order_timeseries(
+            db=db,
+            granularity=granularity,
+            tz="Europe/Berlin",
+            range="month",
+            start_date=None,
+            end_date=None,
+            product_id=None,
+            top=3,
+            top_by="revenue",
+        )
+        stats.get_order_timeseries(
+            db=db,
+            granularity=granularity,
+            tz="UTC",
+            range="custom",
+            start_date=(datetime.utcnow() - timedelta(days=30)).date().isoformat(),
+            end_date=datetime.utcnow().date().isoformat(),
+            product_id=[milk.id],
+            top=0,
+            top_by="quantity",
+        )
+    assert_no_full_scans(engine, statements)
+
+
+def table_lookups(plans):
+    """Plan details that touch a model table, excluding the version counters."""
+    tables = set(Base.metadata.tables) - {"counters"}
+    return [
+        (detail, " ".join(statement.split()))
+        for statement, details in plans
+        for detail in details
+        if detail.split()[0] in ("SCAN", "SEARCH") and detail.split()[1] in tables
+    ]
+
+
+_ORDER_TABLES = ("orders", "archived_orders", "order_headers")
+
+
+def assert_index_searches(engine, statements):
+    """Order tables must be searched through an index on code; joined
+    products/users may be searched by primary key."""
+    lookups = table_lookups(query_plans(engine, statements))
+    assert any(detail.split()[1] in _ORDER_TABLES for detail, _ in lookups)
+    misses = [
+        f"{detail}\n    in: {statement}"
+        for detail, statement in lookups
+        if not detail.startswith("SEARCH")
+        or (detail.split()[1] in _ORDER_TABLES and "INDEX" not in detail)
+        or (detail.split()[1] in _ORDER_TABLES and "(code=?)" not in detail)
+    ]
+    assert not misses, "expected SEARCH ... USING INDEX:\n" + "\n".join(misses)
+
+
+@pytest.mark.parametrize("which", [0, 5])  # archived, live
+def test_get_order_by_code_searches_by_index(engine, db, shop, which):
+    with captured_statements(engine) as statements:
+        crud.get_order_by_code(db, shop["codes"][which])
+    assert_index_searches(engine, statements)
+
+
+def test_get_user_order_by_code_searches_by_index(engine, db, shop):
+    with captured_statements(engine) as statements:
+        crud.get_user_order_by_code(db, shop["alice"].id, shop["codes"][3])
+        crud.get_user_order_by_code(db, shop["alice"].id, shop["codes"][0])
+    assert_index_searches(engine, statements)
+
+
+def test_mark_orders_collected_searches_by_index(engine, db, shop):
+    with captured_statements(engine) as statements:
+        crud.mark_orders_collected(db, shop["codes"][9:] + ["NOPE00"])
+    assert_index_searches(engine, statements)
@@ -0,0 +1,77 @@
+# tests/test_stats_cache.py
+import threading
+
+from app import crud
+from app.routers import stats
+
+from conftest import add_product, add_user, cart
+
+
+def test_concurrent_misses_compute_once_per_key_and_keys_in_parallel(
+    db, monkeypatch
+):
+    calls = []
+    b_started = threading.Event()
+
+    def compute(db, start, end):
+        calls.append(start)
+        if start.year == 2024:
+            b_started.set()
+        else:
+            # would deadlock (and time out) if keys shared one lock
+            assert b_started.wait(5)
+        return {"start": start.isoformat()}
+
+    monkeypatch.setattr(stats, "_compute_stats", compute)
+    results = []
+
+    def request(start_date):
+        results.append(
+            stats.get_order_stats(
+                db=db, range="custom", start_date=start_date, end_date="2030-01-01"
+            )
+        )
+
+    threads = [
+        threading.Thread(target=request, args=(day,))
+        for day in ["2023-01-01"] * 5 + ["2024-01-01"] * 5
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 2
+    assert sorted(r["start"][:4] for r in results) == ["2023"] * 5 + ["2024"] * 5
+    assert not stats._computing
+
+
+def test_stats_version_bump_from_another_worker_misses_the_cache(
+    db, session_factory, monkeypatch
+):
+    user = add_user(db)
+    milk = add_product(db)
+    calls = []
+
+    def compute(db, start, end):
+        calls.append(start)
+        return {"call": len(calls)}
+
+    monkeypatch.setattr(stats, "_compute_stats", compute)
+
+    def this_year():
+        return stats.get_order_stats(db=db, range="year", start_date=None, end_date=None)
+
+    assert this_year() == {"call": 1}
+
+    # checkouts bump version:orders, but stats only count collected orders
+    code = crud.create_orders(db, cart((milk.id, 1)), user.id)["code"]
+    assert this_year() == {"call": 1}
+
+    # another worker collects it: here only the shared counter changes
+    other = session_factory()
+    crud.bump_versions(other, "stats")
+    other.commit()
+    other.close()
+
+    assert this_year() == {"call": 2}
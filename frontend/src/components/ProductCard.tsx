@@ -19,7 +19,9 @@ interface ProductCardProps {
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || "http://localhost:8000";
 
 const ProductCard = ({ product, onAddToCart, showAddButton = true }: ProductCardProps) => {
-  const imageSrc = product.image_url ? `${API_BASE_URL}${product.image_url}` : null;
+  // cards show the small thumbnail when the server generated one
+  const imagePath = product.thumbnail_url || product.image_url;
+  const imageSrc = imagePath ? `${API_BASE_URL}${imagePath}` : null;
 
   return (
     <Card className="transition-all hover:shadow-lg overflow-hidden">
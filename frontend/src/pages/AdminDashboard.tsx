@@ -14,6 +14,55 @@ import { RefreshCw, CheckCircle2, Package, Search, X } from "lucide-react";
 import { toast } from "sonner";
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || "http://localhost:8000";
+const ORDERS_PAGE_SIZE = 50;
+
+// Live order feed. GET /orders/events is Server-Sent Events, but EventSource
+// can't send the Bearer header, so every (re)connect first fetches a
+// short-lived ?token= and resumes after the last event seen.
+function subscribeToOrderEvents(onChange: () => void): () => void {
+  let source: EventSource | null = null;
+  let lastEventId: string | null = null;
+  let retryTimer: number | undefined;
+  let changeTimer: number | undefined;
+  let closed = false;
+
+  const handle = (e: Event) => {
+    const id = (e as MessageEvent).lastEventId;
+    if (id) lastEventId = id;
+    // collapse bursts (e.g. a bulk collect) into one refetch
+    clearTimeout(changeTimer);
+    changeTimer = window.setTimeout(onChange, 300);
+  };
+
+  const connect = async () => {
+    try {
+      const { data } = await api.post<{ token: string }>("/orders/events/token");
+      if (closed) return;
+      const params = new URLSearchParams({ token: data.token });
+      if (lastEventId) params.set("since", lastEventId);
+      source = new EventSource(`${API_BASE_URL}/orders/events?${params}`);
+      for (const type of ["order.created", "order.collected", "resync"]) {
+        source.addEventListener(type, handle);
+      }
+      source.onerror = () => {
+        // the URL token has expired by the time EventSource retries; get a new one
+        source?.close();
+        if (!closed) retryTimer = window.setTimeout(connect, 3000);
+      };
+    } catch (error) {
+      console.error("Failed to open order feed:", error);
+      if (!closed) retryTimer = window.setTimeout(connect, 10000);
+    }
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    source?.close();
+    clearTimeout(retryTimer);
+    clearTimeout(changeTimer);
+  };
+}
 
 type MonthlyStat = {
   month: string;
@@ -54,6 +103,8 @@ const AdminDashboard = () => {
   const [preview, setPreview] = useState<string | null>(null);
   const [isLoadingProducts, setIsLoadingProducts] = useState(true);
   const [isLoadingAllOrders, setIsLoadingAllOrders] = useState(true);
+  const [ordersCursor, setOrdersCursor] = useState<string | null>(null);
+  const [isLoadingMoreOrders, setIsLoadingMoreOrders] = useState(false);
   const [isLoadingOrder, setIsLoadingOrder] = useState(false);
   const [isCreating, setIsCreating] = useState(false);
   const [updatingOrderCode, setUpdatingOrderCode] = useState<string | null>(null);
@@ -90,10 +141,11 @@ const AdminDashboard = () => {
 
   useEffect(() => {
     let interval: number | undefined;
+    let closeFeed: (() => void) | undefined;
 
     if (activeTab === "all-orders") {
       fetchAllOrders();
-      interval = window.setInterval(fetchAllOrders, 10000);
+      closeFeed = subscribeToOrderEvents(() => fetchAllOrders(true));
     }
 
     if (activeTab === "stats") {
@@ -103,6 +155,7 @@ const AdminDashboard = () => {
 
     return () => {
       if (interval) clearInterval(interval);
+      closeFeed?.();
     };
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [activeTab]);
@@ -121,11 +174,23 @@ const AdminDashboard = () => {
     }
   };
 
-  const fetchAllOrders = async () => {
-    setIsLoadingAllOrders(true);
+  // GET /orders/ is paginated: newest first, X-Next-Cursor points at the next page
+  const fetchAllOrders = async (keepOlder = false) => {
+    if (!keepOlder) setIsLoadingAllOrders(true);
     try {
-      const response = await api.get<OrderDetail[]>("/orders/");
-      setAllOrders(response.data);
+      const response = await api.get<OrderDetail[]>("/orders/", {
+        params: { limit: ORDERS_PAGE_SIZE },
+      });
+      const firstPage = response.data;
+      if (keepOlder) {
+        // live update: refresh the newest page but keep older orders already loaded,
+        // so the cursor (after the oldest loaded order) stays valid
+        const codes = new Set(firstPage.map((o) => o.code));
+        setAllOrders((prev) => [...firstPage, ...prev.filter((o) => !codes.has(o.code))]);
+      } else {
+        setAllOrders(firstPage);
+        setOrdersCursor(response.headers["x-next-cursor"] ?? null);
+      }
     } catch (error) {
       console.error("Failed to load orders:", error);
       toast.error("Failed to load orders");
@@ -134,6 +199,26 @@ const AdminDashboard = () => {
     }
   };
 
+  const fetchMoreOrders = async () => {
+    if (!ordersCursor) return;
+    setIsLoadingMoreOrders(true);
+    try {
+      const response = await api.get<OrderDetail[]>("/orders/", {
+        params: { limit: ORDERS_PAGE_SIZE, cursor: ordersCursor },
+      });
+      setAllOrders((prev) => {
+        const codes = new Set(prev.map((o) => o.code));
+        return [...prev, ...response.data.filter((o) => !codes.has(o.code))];
+      });
+      setOrdersCursor(response.headers["x-next-cursor"] ?? null);
+    } catch (error) {
+      console.error("Failed to load more orders:", error);
+      toast.error("Failed to load more orders");
+    } finally {
+      setIsLoadingMoreOrders(false);
+    }
+  };
+
   const fetchStats = async () => {
     setIsLoadingStats(true);
     try {
@@ -228,7 +313,9 @@ const AdminDashboard = () => {
     try {
       await api.patch(`/orders/${code}`, { collected: true });
       toast.success("Order marked as collected!");
-      await fetchAllOrders();
+      // the order may sit on an older page that a refresh of the first page won't reach
+      setAllOrders((prev) => prev.map((o) => (o.code === code ? { ...o, collected: true } : o)));
+      await fetchAllOrders(true);
 
       if (order?.code === code) {
         const refreshed = await api.get<OrderDetail>(`/orders/${code}`);
@@ -762,7 +849,7 @@ const AdminDashboard = () => {
               <CardHeader>
                 <div className="flex justify-between items-center">
                   <CardTitle>All Orders ({groupedOrders.length})</CardTitle>
-                  <Button variant="outline" onClick={fetchAllOrders} disabled={isLoadingAllOrders}>
+                  <Button variant="outline" onClick={() => fetchAllOrders()} disabled={isLoadingAllOrders}>
                     <RefreshCw className={`h-4 w-4 mr-2 ${isLoadingAllOrders ? "animate-spin" : ""}`} />
                     Refresh
                   </Button>
@@ -807,6 +894,13 @@ const AdminDashboard = () => {
                         </div>
                       </div>
                     ))}
+                    {ordersCursor && (
+                      <div className="flex justify-center pt-2">
+                        <Button variant="outline" onClick={fetchMoreOrders} disabled={isLoadingMoreOrders}>
+                          {isLoadingMoreOrders ? <><RefreshCw className="h-4 w-4 mr-2 animate-spin" /> Loading...</> : "Load more"}
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 )}
               </CardContent>
@@ -10,6 +10,19 @@ import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Trash2, ShoppingBag } from "lucide-react";
 import { toast } from "sonner";
 
+/**
+ * Helper: random UUID v4 for the Idempotency-Key header. crypto.randomUUID only
+ * exists in secure contexts (HTTPS/localhost); getRandomValues works everywhere.
+ */
+function newIdempotencyKey(): string {
+  if (typeof crypto.randomUUID === "function") return crypto.randomUUID();
+  const bytes = crypto.getRandomValues(new Uint8Array(16));
+  bytes[6] = (bytes[6] & 0x0f) | 0x40; // version 4
+  bytes[8] = (bytes[8] & 0x3f) | 0x80; // RFC 4122 variant
+  const hex = Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
 /**
  * Helper: try to extract friendly message(s) from different API error shapes.
  * But we won't show raw objects; we prefer inline messages.
@@ -63,6 +76,8 @@ const Cart = () => {
   const [isLoading, setIsLoading] = useState(false);
   const navigate = useNavigate();
   const commitTimers = useRef<Record<number, number | null>>({});
+  // reused when the same cart is submitted again (e.g. after a timeout) so the server can dedupe
+  const checkoutKey = useRef<{ items: string; key: string } | null>(null);
 
   useEffect(() => {
     loadCart();
@@ -226,8 +241,16 @@ const Cart = () => {
         quantity: item.quantity,
       }));
 
-      const response = await api.post<OrderResponse>("/orders/", orderItems);
+      const itemsJson = JSON.stringify(orderItems);
+      if (!checkoutKey.current || checkoutKey.current.items !== itemsJson) {
+        checkoutKey.current = { items: itemsJson, key: newIdempotencyKey() };
+      }
+
+      const response = await api.post<OrderResponse>("/orders/", orderItems, {
+        headers: { "Idempotency-Key": checkoutKey.current.key },
+      });
 
+      checkoutKey.current = null;
       localStorage.removeItem("cart");
       setCart([]);
       setRawInputs({});
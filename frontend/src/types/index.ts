@@ -12,6 +12,7 @@ export interface Product {
   description: string;
   quantity?: number;      // current stock (optional because some endpoints may not include)
   image_url?: string | null; // relative URL to /static/uploads/... (optional)
+  thumbnail_url?: string | null; // small rendition for cards (optional)
   created_at?: string;
 }
 